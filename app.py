@@ -1,27 +1,128 @@
-from flask import Flask, request, jsonify, render_template, flash, redirect, url_for
+from flask import Flask, Request, Response, request, jsonify, render_template, flash, redirect, url_for, stream_with_context
 import tensorflow as tf
-from tensorflow.keras.preprocessing import image
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+import csv
+import hashlib
+import hmac
 import io
+import json
 import os
-import uuid
+import threading
+import time
+import warnings
+import zipfile
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 # Import XAI module
-from xai_explanations import xai_explainer
+from xai_explanations import xai_explainer, IMAGE_XAI_METHODS
+import crop_recommender
+import crop_retrain
+import crop_yield
+import tflite_backend
+import image_ingest
+from batching import MicroBatcher
+from prediction_cache import PredictionCache
+from explanation_jobs import ExplanationJobQueue
+from explain_tiers import EXPLAIN_TIERS, TierPlanner, parse_budget_ms
+from crop_recommender import CROP_MAP
+from crop_features import CropFeatureEncoder, InvalidFeaturesError
+from flat_forest import FlatForest
+from weather_cache import WeatherCache
+from weather_prefetch import WeatherPrefetcher, WeatherStore
+from http_client import CircuitOpenError, Upstream
+
+class InMemoryUploadRequest(Request):
+    """Keeps image-sized multipart uploads in memory instead of spooling them to temp files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= app.config['MAX_IMAGE_UPLOAD_BYTES']:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    @property
+    def max_content_length(self):
+        """Body cap for this request: MAX_BULK_CONTENT_LENGTH on bulk upload endpoints, MAX_CONTENT_LENGTH elsewhere"""
+        if self.endpoint in BULK_UPLOAD_ENDPOINTS:
+            return app.config['MAX_BULK_CONTENT_LENGTH']
+        return app.config['MAX_CONTENT_LENGTH']
+
+    @property
+    def max_form_parts(self):
+        """Multipart part cap: room for MAX_BULK_FILES images plus form fields on bulk endpoints"""
+        if self.endpoint in BULK_UPLOAD_ENDPOINTS:
+            return app.config['MAX_BULK_FILES'] + 100
+        return app.config.get('MAX_FORM_PARTS', 1000)
 
 # Initialize the Flask application
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.secret_key = 'your-secret-key-here-change-in-production'  # Set a proper secret key
 
-# --- Create a folder for temporary uploads ---
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# --- Upload limits ---
+# Single-image endpoints reject anything larger before the body is parsed
+app.config['MAX_IMAGE_UPLOAD_BYTES'] = image_ingest.MAX_IMAGE_BYTES
+# Hard cap for any request body
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+# Larger cap only for the endpoints that take many images or records in one upload
+app.config['MAX_BULK_CONTENT_LENGTH'] = int(os.environ.get('MAX_BULK_CONTENT_LENGTH', 512 * 1024 * 1024))
+BULK_UPLOAD_ENDPOINTS = {'predict_bulk', 'recommend_crop_batch', 'predict_yield_batch'}
+app.config['MAX_BULK_FILES'] = int(os.environ.get('MAX_BULK_FILES', '2000'))
+# /recommend_crop_batch scores uploaded field records this many rows per model call
+app.config['CROP_BATCH_CHUNK_ROWS'] = int(os.environ.get('CROP_BATCH_CHUNK_ROWS', '1024'))
+app.config['MAX_CROP_BATCH_ROWS'] = int(os.environ.get('MAX_CROP_BATCH_ROWS', '100000'))
+
+# --- Inference settings ---
+# 'keras' runs the .h5 models directly; 'tflite-float16' / 'tflite-int8' run quantized copies
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'keras')
+app.config['TFLITE_NUM_THREADS'] = int(os.environ.get('TFLITE_NUM_THREADS', '2'))
+# Crop recommender: 'sklearn' predict_proba or the array-backed 'flat' forest evaluator
+app.config['CROP_INFERENCE_ENGINE'] = os.environ.get('CROP_INFERENCE_ENGINE', 'sklearn')
+app.config['CROP_MODEL_N_JOBS'] = int(os.environ.get('CROP_MODEL_N_JOBS', '1'))
+# Workers look for a newly published (retrained) crop model this often
+app.config['CROP_MODEL_CHECK_SECONDS'] = float(os.environ.get('CROP_MODEL_CHECK_SECONDS', '15'))
+# Outbound APIs: pooled sessions, per-upstream timeouts/retries, circuit breakers.
+# Base URLs can point at a local stub (stub_upstreams.py) for testing.
+app.config['OPEN_METEO_BASE_URL'] = os.environ.get('OPEN_METEO_BASE_URL', 'https://api.open-meteo.com')
+app.config['OPEN_METEO_TIMEOUT'] = float(os.environ.get('OPEN_METEO_TIMEOUT', '5'))
+app.config['OPEN_METEO_RETRIES'] = int(os.environ.get('OPEN_METEO_RETRIES', '2'))
+app.config['OPEN_METEO_DEADLINE'] = float(os.environ.get('OPEN_METEO_DEADLINE', '8'))
+app.config['DATA_GOV_BASE_URL'] = os.environ.get('DATA_GOV_BASE_URL', 'https://api.data.gov.in')
+app.config['DATA_GOV_TIMEOUT'] = float(os.environ.get('DATA_GOV_TIMEOUT', '10'))
+app.config['DATA_GOV_RETRIES'] = int(os.environ.get('DATA_GOV_RETRIES', '1'))
+app.config['DATA_GOV_DEADLINE'] = float(os.environ.get('DATA_GOV_DEADLINE', '12'))
+app.config['DATA_GOV_API_KEY'] = os.environ.get('DATA_GOV_API_KEY', '579b464db66ec23bdd000001cdd3946e44ce4aad7209ff7b23ac571b')
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3'))
+app.config['CIRCUIT_FAILURE_THRESHOLD'] = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+app.config['CIRCUIT_RESET_SECONDS'] = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+# Weather lookups are cached per grid cell until the forecast's next refresh
+app.config['WEATHER_GRID_DEG'] = float(os.environ.get('WEATHER_GRID_DEG', '0.01'))
+app.config['WEATHER_CACHE_TTL'] = int(os.environ.get('WEATHER_CACHE_TTL', '900'))
+app.config['WEATHER_STALE_TTL'] = int(os.environ.get('WEATHER_STALE_TTL', '3600'))
+# Weather for registered farm locations is refreshed in bulk into a store shared by all workers
+app.config['WEATHER_STORE_PATH'] = os.environ.get('WEATHER_STORE_PATH', os.path.join('artifacts', 'weather.sqlite3'))
+app.config['FARM_LOCATIONS_PATH'] = os.environ.get('FARM_LOCATIONS_PATH', os.path.join('data', 'farm_locations.csv'))
+app.config['WEATHER_PREFETCH_BATCH'] = int(os.environ.get('WEATHER_PREFETCH_BATCH', '100'))
+app.config['WEATHER_PREFETCH_CONCURRENCY'] = int(os.environ.get('WEATHER_PREFETCH_CONCURRENCY', '4'))
+app.config['WEATHER_PREFETCH_INTERVAL'] = int(os.environ.get('WEATHER_PREFETCH_INTERVAL', app.config['WEATHER_CACHE_TTL']))
+# Token for /admin endpoints (X-Admin-Token header); unset disables them
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN') or None
+# Concurrent image requests are merged into one forward pass per model
+app.config['BATCH_MAX_SIZE'] = int(os.environ.get('BATCH_MAX_SIZE', '16'))
+app.config['BATCH_WINDOW_MS'] = float(os.environ.get('BATCH_WINDOW_MS', '5'))
+# Repeat uploads of the same photo are answered from a content-addressed cache
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', '128'))
+app.config['PREDICTION_CACHE_DIR'] = os.environ.get('PREDICTION_CACHE_DIR') or None
+app.config['PREDICTION_CACHE_DISK_MB'] = int(os.environ.get('PREDICTION_CACHE_DISK_MB', '512'))
+# async_explain=1 requests get their explanation from a bounded background pool
+app.config['EXPLAIN_WORKERS'] = int(os.environ.get('EXPLAIN_WORKERS', '2'))
+app.config['EXPLAIN_QUEUE_SIZE'] = int(os.environ.get('EXPLAIN_QUEUE_SIZE', '32'))
+app.config['EXPLAIN_JOB_TTL'] = int(os.environ.get('EXPLAIN_JOB_TTL', '300'))
+# explain=none|text|fast|full per request; explain_budget_ms is capped by EXPLAIN_MAX_BUDGET_MS
+app.config['EXPLAIN_DEFAULT_TIER'] = os.environ.get('EXPLAIN_DEFAULT_TIER', 'full')
+app.config['EXPLAIN_MAX_BUDGET_MS'] = float(os.environ['EXPLAIN_MAX_BUDGET_MS']) if os.environ.get('EXPLAIN_MAX_BUDGET_MS') else None
 
 
 # --- Global variables for models and data ---
@@ -31,17 +132,14 @@ crop_recommendation_model = None
 disease_class_names = []
 weed_class_names = []
 crop_model_features = []
+# Everything the crop endpoints use, replaced as one dict so a hot-swap is atomic for requests
+crop_state = None
+yield_state = None  # {'model', 'features', 'encoder'} for crop_yield_model.joblib
 all_states = []
 all_crops_for_fertilizer = []
+model_versions = {}
 
 # --- Data Dictionaries ---
-CROP_MAP = {
-    'AREC': 'Arecanut', 'ARHR': 'Arhar/Tur', 'BAJR': 'Bajra', 'BANA': 'Banana', 'BARL': 'Barley',
-    'BLAC': 'Black pepper', 'COTN': 'Cotton', 'GNUT': 'Groundnut', 'JOWA': 'Jowar', 
-    'MAIZ': 'Maize', 'MOOG': 'Moong (Green Gram)', 'ONIO': 'Onion', 'POTA': 'Potato',
-    'RAGI': 'Ragi', 'RICE': 'Rice', 'RM': 'Rapeseed & Mustard', 'SOYB': 'Soyabean', 
-    'SUGC': 'Sugarcane', 'WHEAT': 'Wheat', 'CPEA': 'Cowpea', 'TURM': 'Turmeric'
-}
 CROP_NUTRIENTS = {
     'Rice': {'N': 120, 'P': 60, 'K': 60}, 'Wheat': {'N': 150, 'P': 75, 'K': 60},
     'Maize': {'N': 180, 'P': 80, 'K': 70}, 'Sugarcane': {'N': 250, 'P': 85, 'K': 120},
@@ -51,54 +149,225 @@ CROP_NUTRIENTS = {
 }
 all_crops_for_fertilizer = sorted(CROP_NUTRIENTS.keys())
 STATE_MAP_PRICES = { 'Chhattisgarh': 'Chattisgarh' }
+DISEASE_CLASSES = sorted([ 'Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 'Apple___healthy', 'Blueberry___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Cherry_(including_sour)___healthy', 'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Corn_(maize)___Common_rust_', 'Corn_(maize)___Northern_Leaf_Blight', 'Corn_(maize)___healthy', 'Grape___Black_rot', 'Grape___Esca_(Black_Measles)', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Grape___healthy', 'Orange___Haunglongbing_(Citrus_greening)', 'Peach___Bacterial_spot', 'Peach___healthy', 'Pepper,_bell___Bacterial_spot', 'Pepper,_bell___healthy', 'Potato___Early_blight', 'Potato___Late_blight', 'Potato___healthy', 'Raspberry___healthy', 'Soybean___healthy', 'Squash___Powdery_mildew', 'Strawberry___Leaf_scorch', 'Strawberry___healthy', 'Tomato___Bacterial_spot', 'Tomato___Early_blight', 'Tomato___Late_blight', 'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot', 'Tomato___Spider_mites Two-spotted_spider_mite', 'Tomato___Target_Spot', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Tomato___Tomato_mosaic_virus', 'Tomato___healthy' ])
+WEED_CLASSES = sorted([ 'Black-grass', 'Charlock', 'Cleavers', 'Common Chickweed', 'Common wheat', 'Fat Hen', 'Loose Silky-bent', 'Maize', 'Scentless Mayweed', "Shepherd’s Purse", 'Small-flowered Cranesbill', 'Sugar beet' ])
+
+
+def load_image_model(h5_path):
+    """Load an image classifier with the configured inference backend"""
+    backend = app.config['INFERENCE_BACKEND']
+    if backend == 'keras':
+        return tf.keras.models.load_model(h5_path)
+    if backend.startswith('tflite-'):
+        return tflite_backend.load_model(h5_path, backend.split('-', 1)[1],
+                                         num_threads=app.config['TFLITE_NUM_THREADS'])
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}'")
+
+def model_version(h5_path):
+    """Identity of a loaded image model: backend plus a hash of its weights"""
+    return f"{app.config['INFERENCE_BACKEND']}:{tflite_backend.file_hash(h5_path)[:16]}"
+
+def load_disease_model():
+    global disease_model, disease_class_names
+    disease_class_names = DISEASE_CLASSES
+    disease_model = load_image_model('disease_detection_model.h5')
+    model_versions['disease'] = model_version('disease_detection_model.h5')
+    print("✅ Disease detection model loaded successfully!")
+
+def load_weed_model():
+    global weed_model, weed_class_names
+    weed_class_names = WEED_CLASSES
+    weed_model = load_image_model('weed_detection_model.h5')
+    model_versions['weed'] = model_version('weed_detection_model.h5')
+    print("✅ Weed detection model loaded successfully!")
+
+# The crop model was fitted on a DataFrame but is served plain NumPy rows from CropFeatureEncoder
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+def activate_crop_bundle(bundle):
+    """Prepare a crop recommender bundle for serving, then swap it in with a single assignment"""
+    global crop_state, crop_recommendation_model, crop_model_features, all_states
+    model = bundle['model']
+    # Trained with n_jobs=-1; serving one row at a time, thread start-up costs more than it saves
+    model.n_jobs = app.config['CROP_MODEL_N_JOBS']
+    if app.config['CROP_INFERENCE_ENGINE'] == 'flat':
+        predictor = FlatForest.load_or_export(model, crop_recommender.forest_dir(bundle['data_hash']),
+                                              fingerprint=bundle['trained_at'])
+        print("✅ Crop recommendation served by the flat forest evaluator.")
+    else:
+        predictor = model
+    xai_explainer.prepare_crop_explainer(model, bundle['features'])
+
+    crop_state = {
+        'model': model,
+        'predictor': predictor,  # what serves predict_proba: the sklearn model or its FlatForest
+        'features': bundle['features'],
+        'encoder': CropFeatureEncoder.from_bundle(bundle),
+        'version': bundle['trained_at'],
+    }
+    crop_model_features = bundle['features']
+    all_states = bundle['states']
+    crop_recommendation_model = model
+
+def train_crop_recommender(force=False):
+    """Load the crop recommender artifact, retraining only if the dataset changed or forced"""
+    force = force or os.environ.get('RETRAIN_CROP_MODEL') == '1'
+    _crop_reload['version'] = crop_recommender.pointer_version()
+    activate_crop_bundle(crop_recommender.load_current(force=force))
 
+def load_yield_model():
+    global yield_state
+    yield_state = crop_yield.load()
+    print("✅ Crop yield model loaded successfully!")
 
-def train_crop_recommender():
-    global crop_recommendation_model, crop_model_features, all_states
+# --- Crop model hot-swap ---
+# crop_retrain.py (or /admin/retrain_crop) publishes a new artifact by replacing a pointer
+# file; each worker notices within CROP_MODEL_CHECK_SECONDS and swaps in the background.
+_crop_reload = {'checked': 0.0, 'version': None, 'loading': False}
+_crop_reload_lock = threading.Lock()
+
+def check_crop_model_update():
+    """Start loading a newly published crop model, at most once per check interval"""
+    now = time.monotonic()
+    with _crop_reload_lock:
+        if _crop_reload['loading'] or now - _crop_reload['checked'] < app.config['CROP_MODEL_CHECK_SECONDS']:
+            return
+        _crop_reload['checked'] = now
+        version = crop_recommender.pointer_version()
+        if version is None or version == _crop_reload['version']:
+            return
+        _crop_reload['loading'] = True
+    threading.Thread(target=_reload_published_crop_model, args=(version,), daemon=True).start()
+
+def _reload_published_crop_model(version):
     try:
-        df = pd.read_csv('final_cleaned_data.csv')
-        print("✅ Full dataset 'final_cleaned_data.csv' loaded for recommender.")
-        MAJOR_CROPS = list(CROP_MAP.keys())
-        df = df[df['Crop'].isin(MAJOR_CROPS)]
-        all_states = sorted(df['STNAME'].unique())
-        
-        features = df.drop(columns=['Yield_tonnes_per_hectare', 'date', 'DISTNAME', 'Area_hectares', 'Production_tonnes', 'Latitude', 'Longitude', 'latitude', 'longitude', 'Crop', 'Year.1'], errors='ignore')
-        target = df['Crop']
-        
-        features_encoded = pd.get_dummies(features, columns=['STNAME', 'Season'], drop_first=True)
-        crop_model_features = features_encoded.columns.tolist()
-
-        print("Training the Crop Recommendation model...")
-        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-        model.fit(features_encoded, target)
-        crop_recommendation_model = model
-        print("✅ Crop recommendation model trained successfully!")
+        pointer = crop_recommender.read_pointer()
+        activate_crop_bundle(crop_recommender.load(pointer['artifact']))
+        print(f"✅ Crop recommendation model hot-swapped to '{pointer['artifact']}'.")
+        # Only a successful swap counts; after a failure the next check tries again
+        with _crop_reload_lock:
+            _crop_reload['version'] = version
     except Exception as e:
-        print(f"❌ CRITICAL ERROR: Could not train crop recommendation model: {e}")
+        app.logger.error(f"Crop model hot-swap failed: {e}")
+    finally:
+        with _crop_reload_lock:
+            _crop_reload['loading'] = False
 
-# --- Load all models at startup ---
-with app.app_context():
+# --- Model loading and readiness ---
+MODEL_LOADERS = {
+    'disease': load_disease_model,
+    'weed': load_weed_model,
+    'crop_recommender': train_crop_recommender,
+    'crop_yield': load_yield_model,
+}
+model_status = {name: {'state': 'pending'} for name in MODEL_LOADERS}
+# Models /readyz waits for; the optional yield model is left out by default
+READY_MODELS = [name.strip() for name in os.environ.get(
+    'READY_MODELS', ','.join(name for name in MODEL_LOADERS if name != 'crop_yield')).split(',') if name.strip()]
+_model_status_lock = threading.Lock()
+
+def _set_model_status(name, state, **details):
+    with _model_status_lock:
+        model_status[name] = {'state': state, **details}
+
+def _run_model_loader(name):
+    """Run one loader and record its outcome in model_status"""
+    _set_model_status(name, 'loading')
+    started = time.monotonic()
     try:
-        disease_model = tf.keras.models.load_model('disease_detection_model.h5')
-        disease_class_names = sorted([ 'Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 'Apple___healthy', 'Blueberry___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Cherry_(including_sour)___healthy', 'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Corn_(maize)___Common_rust_', 'Corn_(maize)___Northern_Leaf_Blight', 'Corn_(maize)___healthy', 'Grape___Black_rot', 'Grape___Esca_(Black_Measles)', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Grape___healthy', 'Orange___Haunglongbing_(Citrus_greening)', 'Peach___Bacterial_spot', 'Peach___healthy', 'Pepper,_bell___Bacterial_spot', 'Pepper,_bell___healthy', 'Potato___Early_blight', 'Potato___Late_blight', 'Potato___healthy', 'Raspberry___healthy', 'Soybean___healthy', 'Squash___Powdery_mildew', 'Strawberry___Leaf_scorch', 'Strawberry___healthy', 'Tomato___Bacterial_spot', 'Tomato___Early_blight', 'Tomato___Late_blight', 'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot', 'Tomato___Spider_mites Two-spotted_spider_mite', 'Tomato___Target_Spot', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Tomato___Tomato_mosaic_virus', 'Tomato___healthy' ])
-        print("✅ Disease detection model loaded successfully!")
+        MODEL_LOADERS[name]()
+        _set_model_status(name, 'ready', load_seconds=round(time.monotonic() - started, 2))
     except Exception as e:
-        print(f"❌ Error loading disease detection model: {e}")
+        print(f"❌ Error loading {name} model: {e}")
+        _set_model_status(name, 'failed', error=str(e))
+
+def start_model_loading(background=True, names=None):
+    """Load models concurrently; in background mode the server accepts traffic immediately"""
+    names = list(MODEL_LOADERS) if names is None else list(names)
+    if not names:
+        return []
+    executor = ThreadPoolExecutor(max_workers=len(names), thread_name_prefix='model-loader')
+    futures = [executor.submit(_run_model_loader, name) for name in names]
+    executor.shutdown(wait=not background)
+    return futures
+
+def model_unavailable_response(name, label):
+    """503 while a model is still loading, 500 once loading has failed"""
+    with _model_status_lock:
+        status = dict(model_status[name])
+    if status['state'] == 'failed':
+        return jsonify({'error': f'{label} not available', 'status': status}), 500
+    return jsonify({'error': f'{label} is still loading, please retry shortly', 'status': status}), 503
+
+# --- Micro-batching queues; they always call the currently loaded model ---
+disease_batcher = MicroBatcher('disease', lambda batch: disease_model.predict(batch, verbose=0),
+                               app.config['BATCH_MAX_SIZE'], app.config['BATCH_WINDOW_MS'])
+weed_batcher = MicroBatcher('weed', lambda batch: weed_model.predict(batch, verbose=0),
+                            app.config['BATCH_MAX_SIZE'], app.config['BATCH_WINDOW_MS'])
+
+IMAGE_BATCHERS = {'disease': disease_batcher, 'weed': weed_batcher}
+# Runs per-model explanation work for /analyze side by side
+analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analyze')
+
+prediction_cache = PredictionCache(
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    disk_dir=app.config['PREDICTION_CACHE_DIR'],
+    disk_max_bytes=app.config['PREDICTION_CACHE_DISK_MB'] * 1024 * 1024
+)
+
+explanation_jobs = ExplanationJobQueue(
+    max_workers=app.config['EXPLAIN_WORKERS'],
+    max_pending=app.config['EXPLAIN_QUEUE_SIZE'],
+    ttl=app.config['EXPLAIN_JOB_TTL']
+)
+
+tier_planner = TierPlanner()
+
+# --- Load all models at startup ---
+# Models listed in DEFER_MODEL_LOADING are left for each gunicorn worker to load after fork
+DEFERRED_MODELS = [name.strip() for name in os.environ.get('DEFER_MODEL_LOADING', '').split(',') if name.strip()]
+start_model_loading(
+    background=os.environ.get('BACKGROUND_MODEL_LOADING', '1') == '1',
+    names=[name for name in MODEL_LOADERS if name not in DEFERRED_MODELS]
+)
+
+def read_uploaded_bytes():
+    """Read the 'file' upload into memory; returns (data, error_response)"""
+    if request.content_length and request.content_length > app.config['MAX_IMAGE_UPLOAD_BYTES']:
+        return None, (jsonify({'error': 'Image too large'}), 413)
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return None, (jsonify({'error': 'No file provided'}), 400)
 
     try:
-        weed_model = tf.keras.models.load_model('weed_detection_model.h5')
-        weed_class_names = sorted([ 'Black-grass', 'Charlock', 'Cleavers', 'Common Chickweed', 'Common wheat', 'Fat Hen', 'Loose Silky-bent', 'Maize', 'Scentless Mayweed', "Shepherd’s Purse", 'Small-flowered Cranesbill', 'Sugar beet' ])
-        print("✅ Weed detection model loaded successfully!")
-    except Exception as e:
-        print(f"❌ Error loading weed detection model: {e}")
+        return image_ingest.read_upload(file, app.config['MAX_IMAGE_UPLOAD_BYTES']), None
+    except image_ingest.ImageTooLargeError as e:
+        return None, (jsonify({'error': str(e)}), 413)
+    except image_ingest.InvalidImageError as e:
+        return None, (jsonify({'error': str(e)}), 400)
 
-    train_crop_recommender()
+def decode_uploaded_image(data, target_size=(128, 128)):
+    """Decode upload bytes into a model-ready batch; returns (batch, error_response)"""
+    try:
+        return image_ingest.decode_image(data, target_size), None
+    except image_ingest.ImageTooLargeError as e:
+        return None, (jsonify({'error': str(e)}), 413)
+    except image_ingest.InvalidImageError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+def get_image_model(model_type):
+    """Return (model, class_names) for 'disease' or 'weed'"""
+    if model_type == 'disease':
+        return disease_model, disease_class_names
+    if model_type == 'weed':
+        return weed_model, weed_class_names
+    raise ValueError(f"Unknown model '{model_type}'")
 
-def preprocess_image(file_path, target_size=(128, 128)):
-    img = image.load_img(file_path, target_size=target_size)
-    img_array = image.img_to_array(img)
-    img_batch = np.expand_dims(img_array, axis=0)
-    return img_batch / 255.0
+def format_prediction_label(model_type, predicted_class):
+    if model_type == 'disease':
+        return predicted_class.replace('___', ' - ').replace('_', ' ')
+    return predicted_class.replace('_', ' ')
 
 @app.route('/')
 def home():
@@ -110,217 +379,904 @@ def home():
         flash('An error occurred loading the page. Please refresh.', 'error')
         return render_template('index.html', states=[], fertilizer_crops=[])
 
-@app.route('/predict_disease', methods=['POST'])
-def predict_disease():
-    """Disease detection API endpoint with XAI explanations"""
-    if not disease_model:
-        return jsonify({'error': 'Disease model not available'}), 500
-        
-    file = request.files.get('file')
-    if not file or file.filename == '':
-        return jsonify({'error': 'No file provided'}), 400
-        
+def explain_image(model_type, processed_image, confidence, predicted_class, method=None, tier='full',
+                  time_budget_ms=None):
+    """XAI explanation for one image prediction at the given tier, or None if it could not be produced"""
+    if tier == 'none':
+        return None
+    if tier == 'text':
+        return xai_explainer.explain_image_text(confidence, predicted_class, model_type)
+    model, _ = get_image_model(model_type)
     try:
-        # Save temporarily
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], str(uuid.uuid4()))
-        file.save(filepath)
-        
-        # Process image
-        processed_image = preprocess_image(filepath)
-        prediction = disease_model.predict(processed_image)
-        
-        # Extract results
-        confidence = float(np.max(prediction))
-        predicted_class = disease_class_names[np.argmax(prediction)]
-        formatted_prediction = predicted_class.replace('___', ' - ').replace('_', ' ')
-        
-        # Generate XAI explanation
+        return xai_explainer.explain_image_prediction(
+            model, 
+            processed_image, 
+            confidence,
+            predicted_class,
+            model_type=model_type,
+            method='gradcam' if tier == 'fast' else method,
+            time_budget=time_budget_ms / 1000 if time_budget_ms is not None else None,
+            # The fast tier never turns into a full LIME run when Grad-CAM is unavailable
+            gradcam_fallback='text' if tier == 'fast' else 'lime'
+        )
+    except Exception as xai_error:
+        app.logger.warning(f"XAI explanation failed: {xai_error}")
+        return None
+
+def remaining_budget_ms(budget_ms, started):
+    """Milliseconds left of a request's explanation budget, or None when it has none"""
+    if budget_ms is None:
+        return None
+    return budget_ms - (time.monotonic() - started) * 1000
+
+def build_image_result(model_type, prediction, processed_image, tier='full', method=None, budget_ms=None, started=None):
+    """Turn raw model output into the response payload, with an XAI explanation at the given tier"""
+    _, class_names = get_image_model(model_type)
+    
+    # Extract results
+    confidence = float(np.max(prediction))
+    predicted_class = class_names[np.argmax(prediction)]
+    formatted_prediction = format_prediction_label(model_type, predicted_class)
+    
+    response_data = {
+        'prediction': formatted_prediction,
+        'confidence': confidence
+    }
+    if tier == 'none':
+        return response_data
+    
+    # Downgrade to a cheaper tier if the budget cannot cover the requested one
+    remaining = remaining_budget_ms(budget_ms, started or time.monotonic())
+    kind = f'image:{model_type}'
+    used_tier = tier_planner.choose(kind, tier, remaining)
+    explain_started = time.monotonic()
+    xai_explanation = explain_image(model_type, processed_image, confidence, predicted_class, method, used_tier,
+                                    remaining if used_tier == 'full' else None)
+    if used_tier == 'fast' and xai_explanation and xai_explanation.get('method') == 'text':
+        # Grad-CAM was unavailable; its failed attempt says nothing about either tier's cost
+        used_tier = 'text'
+    elif is_fallback_explanation(xai_explanation):
+        # A failed explanation's time is not what the tier costs
+        pass
+    else:
+        tier_planner.record(kind, used_tier, (time.monotonic() - explain_started) * 1000)
+    
+    # Add XAI explanation if available
+    if xai_explanation:
+        xai_explanation['tier'] = used_tier
+        if used_tier != tier:
+            xai_explanation['requested_tier'] = tier
+        response_data['xai'] = xai_explanation
+    return response_data
+
+def run_image_prediction(model_type, processed_image, tier='full', method=None, budget_ms=None, started=None):
+    """Classify one decoded image through the model's micro-batcher"""
+    prediction = IMAGE_BATCHERS[model_type].predict(processed_image)
+    return build_image_result(model_type, prediction, processed_image, tier, method, budget_ms, started)
+
+def image_cache_key(data, model_type, tier='full', method=None):
+    if tier == 'none':
+        variant = 'label'
+    elif tier in ('text', 'fast'):
+        variant = tier
+    else:
+        variant = f"full:{method or xai_explainer.default_method}"
+    return PredictionCache.make_key(data, f"{model_type}:{model_versions.get(model_type, '')}", variant)
+
+def requested_explain_tier(data=None):
+    """The 'explain' tier and 'explain_budget_ms' from the query string, form or JSON body
+
+    Returns (tier, budget_ms, error_response). The budget is capped by EXPLAIN_MAX_BUDGET_MS.
+    """
+    def field(name):
+        value = request.args.get(name)
+        if value is None:
+            value = request.form.get(name)
+        if value is None and isinstance(data, dict):
+            value = data.get(name)
+        return value
+
+    tier = str(field('explain') or app.config['EXPLAIN_DEFAULT_TIER']).strip().lower()
+    if tier not in EXPLAIN_TIERS:
+        return None, None, (jsonify({'error': f"explain must be one of {', '.join(EXPLAIN_TIERS)}"}), 400)
+    try:
+        budget_ms = parse_budget_ms(field('explain_budget_ms'))
+    except (TypeError, ValueError):
+        return None, None, (jsonify({'error': 'explain_budget_ms must be a non-negative number'}), 400)
+    max_budget_ms = app.config['EXPLAIN_MAX_BUDGET_MS']
+    if max_budget_ms is not None:
+        budget_ms = max_budget_ms if budget_ms is None else min(budget_ms, max_budget_ms)
+    return tier, budget_ms, None
+
+def requested_xai_method():
+    """The 'xai_method' form field ('lime' or 'gradcam'); returns (method, error_response)"""
+    method = request.form.get('xai_method') or None
+    if method and method not in IMAGE_XAI_METHODS:
+        return None, (jsonify({'error': f"xai_method must be one of {', '.join(IMAGE_XAI_METHODS)}"}), 400)
+    return method, None
+
+def is_fallback_explanation(xai_explanation):
+    """The explainer failed and returned its generic text instead of a real explanation"""
+    return bool(xai_explanation) and xai_explanation.get('method') == 'fallback'
+
+def is_truncated_explanation(xai_explanation):
+    """A LIME run cut short by a time budget; Grad-CAM and text explanations are always complete"""
+    samples = (xai_explanation or {}).get('samples')
+    lime = xai_explainer.lime_explainer
+    return samples is not None and lime is not None and samples < lime.num_samples
+
+def is_cacheable(response_data, tier='full'):
+    """Only complete answers are cached, so a failed, downgraded or truncated explanation is retried next time"""
+    if tier == 'none':
+        return True
+    xai_explanation = response_data.get('xai', {})
+    return (xai_explanation.get('tier') == tier and not is_fallback_explanation(xai_explanation)
+            and not is_truncated_explanation(xai_explanation))
+
+# --- Asynchronous explanations ---
+# Job ids are '<cache key>-<created unix time>'. Every finished job stores its final state
+# under job_state_key() in the prediction cache, so with PREDICTION_CACHE_DIR any worker
+# can answer a poll and tell an unknown-but-recent job from an expired one.
+def job_state_key(job_id):
+    return hashlib.sha256(f'xai-job:{job_id}'.encode()).hexdigest()
+
+def start_async_explanation(model_type, processed_image, cache_key, method=None, tier='full'):
+    """Return the prediction now and compute its explanation on the background pool"""
+    prediction = IMAGE_BATCHERS[model_type].predict(processed_image)
+    response_data = build_image_result(model_type, prediction, processed_image, tier='none')
+    predicted_class = get_image_model(model_type)[1][int(np.argmax(prediction))]
+    # The cached full answer is built from the label-only payload, never the job link added below
+    label_payload = dict(response_data)
+
+    job_id = f"{cache_key}-{int(time.time())}"
+
+    def explain():
+        xai_explanation = explain_image(model_type, processed_image, label_payload['confidence'], predicted_class,
+                                        method, tier)
+        if not xai_explanation or is_fallback_explanation(xai_explanation):
+            raise RuntimeError('Explanation could not be generated')
+        if tier == 'fast' and xai_explanation.get('method') == 'text':
+            # Degraded: reported to the poller, but not stored as the fast-tier answer
+            xai_explanation.update(tier='text', requested_tier=tier)
+            return xai_explanation
+        xai_explanation['tier'] = tier
+        if not is_truncated_explanation(xai_explanation):
+            prediction_cache.put(cache_key, {**label_payload, 'xai': xai_explanation})
+        return xai_explanation
+
+    def job():
         try:
-            xai_explanation = xai_explainer.explain_image_prediction(
-                disease_model, 
-                processed_image, 
-                confidence,
-                predicted_class,
-                model_type='disease'
-            )
-        except Exception as xai_error:
-            app.logger.warning(f"XAI explanation failed: {xai_error}")
-            xai_explanation = None
-        
-        # Clean up
-        os.remove(filepath)
-        
-        response_data = {
-            'prediction': formatted_prediction,
-            'confidence': confidence
+            xai_explanation = explain()
+        except Exception as e:
+            prediction_cache.put(job_state_key(job_id), {'status': 'failed', 'error': str(e)})
+            raise
+        prediction_cache.put(job_state_key(job_id), {'status': 'done', 'result': xai_explanation})
+        return xai_explanation
+
+    if explanation_jobs.submit(job_id, job):
+        response_data['xai_job'] = {
+            'id': job_id,
+            'status_url': url_for('explanation_status', job_id=job_id),
+            'stream_url': url_for('explanation_stream', job_id=job_id)
         }
+    else:
+        # Backlog full: answer without an explanation rather than queue unbounded work
+        response_data['xai_job'] = {'status': 'dropped'}
+    return response_data
+
+def lookup_explanation(job_id):
+    """State of an explanation job: local registry first, then the shared cache"""
+    state = explanation_jobs.get(job_id)
+    if state is not None:
+        return state
+    cache_key, _, created = job_id.rpartition('-')
+    if len(cache_key) != 64 or not created.isdigit():
+        return None
+    final_state = prediction_cache.get(job_state_key(job_id))
+    if final_state is not None:
+        return final_state
+    cached = prediction_cache.get(cache_key)
+    if cached is not None and 'xai' in cached:
+        return {'status': 'done', 'result': cached['xai']}
+    # Only a shared disk tier can ever show another worker's result; without one, fail fast
+    if prediction_cache.disk_dir and time.time() - int(created) < explanation_jobs.ttl:
+        return {'status': 'pending'}  # running on another worker
+    return None
+
+@app.route('/explanations/<job_id>')
+def explanation_status(job_id):
+    """Poll an asynchronous explanation; 202 while it is still being computed"""
+    state = lookup_explanation(job_id)
+    if state is None:
+        return jsonify({'error': 'Unknown or expired explanation job'}), 404
+    if state['status'] in ('pending', 'running'):
+        return jsonify(state), 202
+    return jsonify(state)
+
+@app.route('/explanations/<job_id>/stream')
+def explanation_stream(job_id):
+    """Server-sent events: periodic status events, then one 'result' event"""
+    if lookup_explanation(job_id) is None:
+        return jsonify({'error': 'Unknown or expired explanation job'}), 404
+
+    def generate():
+        deadline = time.time() + explanation_jobs.ttl
+        while time.time() < deadline:
+            state = explanation_jobs.wait(job_id, timeout=1.0)
+            if state is None:
+                state = lookup_explanation(job_id)
+                if state is not None and state['status'] in ('pending', 'running'):
+                    time.sleep(1.0)
+            if state is None:
+                state = {'status': 'expired', 'error': 'Unknown or expired explanation job'}
+            if state['status'] not in ('pending', 'running'):
+                yield f"event: result\ndata: {json.dumps(state)}\n\n"
+                return
+            yield f"event: status\ndata: {json.dumps(state)}\n\n"
+        yield f"event: result\ndata: {json.dumps({'status': 'expired', 'error': 'Timed out waiting for explanation'})}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def image_prediction_response(model_type, label):
+    """Shared request handling for the single-image prediction endpoints"""
+    if not get_image_model(model_type)[0]:
+        return model_unavailable_response(model_type, label)
+
+    started = time.monotonic()
+    data, error_response = read_uploaded_bytes()
+    if error_response:
+        return error_response
+    method, error_response = requested_xai_method()
+    if error_response:
+        return error_response
+    tier, budget_ms, error_response = requested_explain_tier()
+    if error_response:
+        return error_response
+
+    # Identical bytes + identical model => identical answer
+    cache_key = image_cache_key(data, model_type, tier, method)
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    processed_image, error_response = decode_uploaded_image(data)
+    if error_response:
+        return error_response
         
-        # Add XAI explanation if available
-        if xai_explanation:
-            response_data['xai'] = xai_explanation
-            
+    try:
+        if tier in ('fast', 'full') and _form_flag('async_explain', default=False):
+            return jsonify(start_async_explanation(model_type, processed_image, cache_key, method, tier))
+
+        response_data = run_image_prediction(model_type, processed_image, tier, method, budget_ms, started)
+        if is_cacheable(response_data, tier):
+            prediction_cache.put(cache_key, response_data)
         return jsonify(response_data)
         
     except Exception as e:
-        app.logger.error(f"Disease prediction error: {e}")
-        # Clean up file if it exists
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        app.logger.error(f"{model_type.title()} prediction error: {e}")
         return jsonify({'error': 'Failed to process image'}), 500
 
+@app.route('/predict_disease', methods=['POST'])
+def predict_disease():
+    """Disease detection API endpoint with XAI explanations"""
+    return image_prediction_response('disease', 'Disease model')
+
 @app.route('/predict_weed', methods=['POST'])
 def predict_weed():
     """Weed detection API endpoint with XAI explanations"""
-    if not weed_model:
-        return jsonify({'error': 'Weed model not available'}), 500
-        
-    file = request.files.get('file')
-    if not file or file.filename == '':
-        return jsonify({'error': 'No file provided'}), 400
-        
-    try:
-        # Save temporarily
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], str(uuid.uuid4()))
-        file.save(filepath)
-        
-        # Process image
-        processed_image = preprocess_image(filepath)
-        prediction = weed_model.predict(processed_image)
-        
-        # Extract results
-        confidence = float(np.max(prediction))
-        predicted_class = weed_class_names[np.argmax(prediction)]
-        formatted_prediction = predicted_class.replace('_', ' ')
-        
-        # Generate XAI explanation
+    return image_prediction_response('weed', 'Weed model')
+
+def _form_flag(name, default=True):
+    value = request.form.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """Run disease and weed detection on one photo, decoding it only once"""
+    available = [t for t in ('disease', 'weed') if get_image_model(t)[0]]
+    if not available:
+        return model_unavailable_response('disease', 'Image models')
+
+    data, error_response = read_uploaded_bytes()
+    if error_response:
+        return error_response
+
+    method, error_response = requested_xai_method()
+    if error_response:
+        return error_response
+
+    explain = {t: 'full' if _form_flag(f'explain_{t}') else 'none' for t in ('disease', 'weed')}
+    results = {}
+    cache_keys = {}
+    for model_type in available:
+        cache_keys[model_type] = image_cache_key(data, model_type, explain[model_type], method)
+        cached = prediction_cache.get(cache_keys[model_type])
+        if cached is not None:
+            results[model_type] = cached
+
+    pending = [t for t in available if t not in results]
+    if pending:
+        processed_image, error_response = decode_uploaded_image(data)
+        if error_response:
+            return error_response
+        try:
+            # Both models are queued at once and run on their own batcher threads
+            futures = {t: IMAGE_BATCHERS[t].submit(processed_image) for t in pending}
+            predictions = {t: future.result() for t, future in futures.items()}
+            explained = {
+                t: analysis_executor.submit(build_image_result, t, predictions[t], processed_image, explain[t], method)
+                for t in pending
+            }
+            for model_type, future in explained.items():
+                results[model_type] = future.result()
+                if is_cacheable(results[model_type], explain[model_type]):
+                    prediction_cache.put(cache_keys[model_type], results[model_type])
+        except Exception as e:
+            app.logger.error(f"Image analysis error: {e}")
+            return jsonify({'error': 'Failed to process image'}), 500
+
+    for model_type in ('disease', 'weed'):
+        if model_type not in results:
+            with _model_status_lock:
+                results[model_type] = {'error': f'{model_type.title()} model not available',
+                                       'status': dict(model_status[model_type])}
+    return jsonify(results)
+
+def _iter_bulk_uploads(files, archive):
+    """Yield (filename, bytes_or_error) for every uploaded image, reading one at a time"""
+    max_bytes = app.config['MAX_IMAGE_UPLOAD_BYTES']
+    for index, file in enumerate(files):
+        if index >= app.config['MAX_BULK_FILES']:
+            yield file.filename, image_ingest.ImageTooLargeError(f"Upload exceeds {app.config['MAX_BULK_FILES']} image limit")
+            return
+        try:
+            yield file.filename, image_ingest.read_upload(file, max_bytes)
+        except ValueError as e:
+            yield file.filename, e
+    if archive:
+        yield from image_ingest.iter_archive_images(archive.stream, max_bytes, app.config['MAX_BULK_FILES'])
+
+def _classify_chunk(model_type, chunk):
+    """Run one forward pass over a chunk of (index, filename, array) and build result lines"""
+    model, class_names = get_image_model(model_type)
+    predictions = model.predict(np.concatenate([arr for _, _, arr in chunk]), verbose=0)
+    lines = []
+    for (index, filename, _), prediction in zip(chunk, predictions):
+        lines.append({
+            'index': index,
+            'filename': filename,
+            'prediction': format_prediction_label(model_type, class_names[int(np.argmax(prediction))]),
+            'confidence': float(np.max(prediction))
+        })
+    return lines
+
+@app.route('/predict_bulk', methods=['POST'])
+def predict_bulk():
+    """Bulk image classification; streams one NDJSON line per image as chunks finish"""
+    model_type = request.form.get('model', 'disease')
+    if model_type not in ('disease', 'weed'):
+        return jsonify({'error': "model must be 'disease' or 'weed'"}), 400
+    if not get_image_model(model_type)[0]:
+        return model_unavailable_response(model_type, f'{model_type.title()} model')
+
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+    archive = request.files.get('archive')
+    if not files and not archive:
+        return jsonify({'error': "Provide images as 'files' or a zip as 'archive'"}), 400
+    if archive and not zipfile.is_zipfile(archive.stream):
+        return jsonify({'error': 'archive must be a zip file'}), 400
+
+    chunk_size = app.config['BATCH_MAX_SIZE']
+
+    def generate():
+        chunk = []
+        index = -1
+        try:
+            for index, (filename, data) in enumerate(_iter_bulk_uploads(files, archive)):
+                try:
+                    if isinstance(data, Exception):
+                        raise data
+                    chunk.append((index, filename, image_ingest.decode_image(data)))
+                except ValueError as e:
+                    yield json.dumps({'index': index, 'filename': filename, 'error': str(e)}) + '\n'
+                    continue
+                if len(chunk) >= chunk_size:
+                    for line in _classify_chunk(model_type, chunk):
+                        yield json.dumps(line) + '\n'
+                    chunk = []
+            if chunk:
+                for line in _classify_chunk(model_type, chunk):
+                    yield json.dumps(line) + '\n'
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            app.logger.error(f"Bulk prediction error: {e}")
+            yield json.dumps({'index': index, 'error': 'Failed to process images'}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def crop_recommendation(crop, values, payload, tier, budget_ms, started, timings=None):
+    """Top-3 crops for parsed field values, with optional yields and a tiered XAI explanation
+
+    timings, when given, receives each stage's duration in milliseconds.
+    """
+    stage_started = time.monotonic()
+    # Encode straight into the model's feature row
+    final_input = crop['encoder'].encode(values)
+    
+    # Get predictions
+    probabilities = crop['predictor'].predict_proba(final_input)[0]
+    class_names = crop['predictor'].classes_
+    results = list(zip(class_names, probabilities))
+    top_3_results = sorted(results, key=lambda x: x[1], reverse=True)[:3]
+    
+    # Format recommendations
+    recommendations = []
+    for crop_code, confidence in top_3_results:
+        full_name = CROP_MAP.get(crop_code, crop_code)
+        recommendations.append({
+            'crop': full_name,
+            'confidence': round(confidence * 100, 2)
+        })
+    if timings is not None:
+        timings['predict'] = round((time.monotonic() - stage_started) * 1000, 2)
+    
+    # Expected yield of each recommended crop, in one predict call
+    yield_error = None
+    if _json_flag(payload, 'include_yield'):
+        stage_started = time.monotonic()
+        yield_error = add_expected_yields(recommendations, payload, [code for code, _ in top_3_results])
+        if timings is not None:
+            timings['yield'] = round((time.monotonic() - stage_started) * 1000, 2)
+    
+    # Generate XAI explanation
+    xai_explanation = None
+    used_tier = tier_planner.choose('crop', tier, remaining_budget_ms(budget_ms, started))
+    if used_tier != 'none':
         try:
-            xai_explanation = xai_explainer.explain_image_prediction(
-                weed_model, 
-                processed_image, 
-                confidence,
-                predicted_class,
-                model_type='weed'
+            # Extract feature names and values
+            feature_names = list(values.keys())
+            feature_values = list(values.values())
+            
+            explain_started = time.monotonic()
+            xai_explanation = xai_explainer.explain_crop_recommendation(
+                crop['model'],
+                final_input,
+                feature_names,
+                recommendations,
+                feature_values,
+                tier=used_tier
             )
+            explain_ms = (time.monotonic() - explain_started) * 1000
+            tier_planner.record('crop', used_tier, explain_ms)
+            if timings is not None:
+                timings['explain'] = round(explain_ms, 2)
         except Exception as xai_error:
             app.logger.warning(f"XAI explanation failed: {xai_error}")
-            xai_explanation = None
-        
-        # Clean up
-        os.remove(filepath)
-        
-        response_data = {
-            'prediction': formatted_prediction,
-            'confidence': confidence
-        }
-        
-        # Add XAI explanation if available
-        if xai_explanation:
-            response_data['xai'] = xai_explanation
-            
-        return jsonify(response_data)
-        
-    except Exception as e:
-        app.logger.error(f"Weed prediction error: {e}")
-        # Clean up file if it exists
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
-        return jsonify({'error': 'Failed to process image'}), 500
+    
+    response_data = {'recommendations': recommendations}
+    if yield_error:
+        response_data['yield_error'] = yield_error
+    
+    # Add XAI explanation if available
+    if xai_explanation:
+        xai_explanation['tier'] = used_tier
+        if used_tier != tier:
+            xai_explanation['requested_tier'] = tier
+        response_data['xai'] = xai_explanation
+    return response_data
 
 @app.route('/recommend_crop', methods=['POST'])
 def recommend_crop():
     """Crop recommendation API endpoint with XAI explanations"""
-    if not crop_recommendation_model:
-        return jsonify({'error': 'Crop recommendation model not available'}), 500
+    check_crop_model_update()
+    crop = crop_state
+    if not crop:
+        return model_unavailable_response('crop_recommender', 'Crop recommendation model')
         
     try:
+        started = time.monotonic()
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-            
-        # Create input DataFrame
-        input_df = pd.DataFrame([data])
-        input_encoded = pd.get_dummies(input_df)
-        final_input = input_encoded.reindex(columns=crop_model_features, fill_value=0)
-        
-        # Get predictions
-        probabilities = crop_recommendation_model.predict_proba(final_input)[0]
-        class_names = crop_recommendation_model.classes_
-        results = list(zip(class_names, probabilities))
-        top_3_results = sorted(results, key=lambda x: x[1], reverse=True)[:3]
-        
-        # Format recommendations
-        recommendations = []
-        for crop_code, confidence in top_3_results:
-            full_name = CROP_MAP.get(crop_code, crop_code)
-            recommendations.append({
-                'crop': full_name,
-                'confidence': round(confidence * 100, 2)
-            })
-        
-        # Generate XAI explanation
+        tier, budget_ms, error_response = requested_explain_tier(data)
+        if error_response:
+            return error_response
         try:
-            # Extract feature names and values
-            feature_names = list(data.keys())
-            feature_values = list(data.values())
-            
-            xai_explanation = xai_explainer.explain_crop_recommendation(
-                crop_recommendation_model,
-                final_input,
-                feature_names,
-                recommendations,
-                feature_values
-            )
-        except Exception as xai_error:
-            app.logger.warning(f"XAI explanation failed: {xai_error}")
-            xai_explanation = None
-        
-        response_data = {'recommendations': recommendations}
-        
-        # Add XAI explanation if available
-        if xai_explanation:
-            response_data['xai'] = xai_explanation
+            values = crop['encoder'].parse(data)
+        except InvalidFeaturesError as e:
+            return jsonify({'error': str(e)}), 400
             
-        return jsonify(response_data)
+        return jsonify(crop_recommendation(crop, values, data, tier, budget_ms, started))
         
     except Exception as e:
         app.logger.error(f"Crop recommendation error: {e}")
         return jsonify({'error': 'Failed to generate recommendations'}), 500
 
+CROP_BATCH_FORMATS = {
+    'text/csv': 'csv', 'application/csv': 'csv',
+    'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl', 'application/json-lines': 'jsonl',
+    '.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+}
+
+def _iter_crop_records(stream, record_format):
+    """Yield one field record (a dict) or a ValueError per input row, reading lazily"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if record_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'Invalid JSON line: {e}')
+
+def top_crop_indices(probabilities, k=3):
+    """Column indices of the k most likely crops per row, best first"""
+    k = min(k, probabilities.shape[1])
+    top = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    order = np.argsort(-np.take_along_axis(probabilities, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def _record_error_lines(chunk, errors, lines):
+    for position, message in errors.items():
+        record = chunk[position][1]
+        lines[position] = {'index': chunk[position][0],
+                           'error': str(record) if isinstance(record, Exception) else message}
+
+def _record_line(index, record):
+    line = {'index': index}
+    if 'id' in record:
+        line['id'] = record['id']
+    return line
+
+def _score_crop_chunk(crop, chunk, buffer):
+    """Encode a chunk of (index, record) into the reusable buffer and score it with one predict_proba"""
+    records = [record if isinstance(record, dict) else None for _, record in chunk]
+    matrix, valid, errors = crop['encoder'].encode_many(records, out=buffer)
+    lines = [None] * len(chunk)
+    _record_error_lines(chunk, errors, lines)
+    if valid:
+        probabilities = crop['predictor'].predict_proba(matrix)
+        top = top_crop_indices(probabilities)
+        confidences = np.take_along_axis(probabilities, top, axis=1)
+        class_names = crop['predictor'].classes_
+        for row, position in enumerate(valid):
+            line = _record_line(*chunk[position])
+            line['recommendations'] = [
+                {'crop': CROP_MAP.get(class_names[c], class_names[c]), 'confidence': round(float(p) * 100, 2)}
+                for c, p in zip(top[row], confidences[row])
+            ]
+            lines[position] = line
+    return lines
+
+def batch_record_source():
+    """(stream, 'csv' or 'jsonl', error_response) for a batch upload: raw body or multipart 'file'"""
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        detected = CROP_BATCH_FORMATS.get(os.path.splitext(upload.filename or '')[1].lower())
+    else:
+        stream = request.stream
+        detected = CROP_BATCH_FORMATS.get(request.mimetype)
+    record_format = request.args.get('format') or request.form.get('format') or detected
+    if record_format not in ('csv', 'jsonl'):
+        return None, None, (jsonify({'error': "Send CSV or JSON Lines (Content-Type text/csv or application/x-ndjson, "
+                                              "a .csv/.jsonl 'file', or format=csv|jsonl)"}), 400)
+    return stream, record_format, None
+
+def stream_scored_records(stream, record_format, score_chunk, label):
+    """NDJSON response that reads records lazily and scores them CROP_BATCH_CHUNK_ROWS at a time"""
+    chunk_size = app.config['CROP_BATCH_CHUNK_ROWS']
+    max_rows = app.config['MAX_CROP_BATCH_ROWS']
+
+    def generate():
+        chunk = []
+        index = -1
+        try:
+            for index, record in enumerate(_iter_crop_records(stream, record_format)):
+                if index >= max_rows:
+                    yield json.dumps({'index': index, 'error': f'Batch exceeds {max_rows} row limit'}) + '\n'
+                    return
+                chunk.append((index, record))
+                if len(chunk) >= chunk_size:
+                    for line in score_chunk(chunk):
+                        yield json.dumps(line) + '\n'
+                    chunk = []
+            if chunk:
+                for line in score_chunk(chunk):
+                    yield json.dumps(line) + '\n'
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            app.logger.error(f"{label} error: {e}")
+            yield json.dumps({'index': index, 'error': 'Failed to score records'}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/recommend_crop_batch', methods=['POST'])
+def recommend_crop_batch():
+    """Top-3 crops for many field records (CSV or JSON Lines), streamed back as NDJSON"""
+    check_crop_model_update()
+    # The whole upload is scored by the model that was live when it started
+    crop = crop_state
+    if not crop:
+        return model_unavailable_response('crop_recommender', 'Crop recommendation model')
+    stream, record_format, error_response = batch_record_source()
+    if error_response:
+        return error_response
+
+    # One buffer per request, reused for every chunk so memory stays flat
+    buffer = np.empty((app.config['CROP_BATCH_CHUNK_ROWS'], len(crop['features'])), dtype=crop['encoder'].dtype)
+    return stream_scored_records(stream, record_format, lambda chunk: _score_crop_chunk(crop, chunk, buffer),
+                                 'Batch crop recommendation')
+
+# --- Yield prediction ---
+def _json_flag(data, name):
+    value = request.args.get(name, data.get(name) if isinstance(data, dict) else None)
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _with_crop_value(state, record):
+    if isinstance(record, dict) and record.get('Crop') not in (None, ''):
+        return {**record, 'Crop': crop_yield.crop_value(state['encoder'], record['Crop'])}
+    return record
+
+def add_expected_yields(recommendations, payload, crop_codes):
+    """Add expected_yield_t_per_ha to each recommendation; returns an error message or None"""
+    state = yield_state
+    if not state:
+        return 'Yield model not available'
+    encoder = state['encoder']
+    rows = np.zeros((len(crop_codes), len(state['features'])), dtype=encoder.dtype)
+    try:
+        for i, code in enumerate(crop_codes):
+            encoder.encode(encoder.parse(_with_crop_value(state, {**payload, 'Crop': code})), out=rows[i])
+    except InvalidFeaturesError as e:
+        return f'Expected yield unavailable: {e}'
+    for recommendation, expected in zip(recommendations, state['model'].predict(rows)):
+        recommendation['expected_yield_t_per_ha'] = round(float(expected), 3)
+    return None
+
+@app.route('/predict_yield', methods=['POST'])
+def predict_yield():
+    """Expected yield (tonnes per hectare) of one crop under the given conditions"""
+    state = yield_state
+    if not state:
+        return model_unavailable_response('crop_yield', 'Yield model')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({'error': 'No data provided'}), 400
+    try:
+        values = state['encoder'].parse(_with_crop_value(state, data))
+        expected = float(state['model'].predict(state['encoder'].encode(values))[0])
+    except InvalidFeaturesError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Yield prediction error: {e}")
+        return jsonify({'error': 'Failed to predict yield'}), 500
+    crop = values.get('Crop', data.get('Crop'))
+    return jsonify({'crop': CROP_MAP.get(crop, crop), 'expected_yield_t_per_ha': round(expected, 3)})
+
+def _score_yield_chunk(state, chunk, buffer):
+    """Encode a chunk of (index, record) into the reusable buffer and predict it in one call"""
+    records = [_with_crop_value(state, record) if isinstance(record, dict) else None for _, record in chunk]
+    matrix, valid, errors = state['encoder'].encode_many(records, out=buffer)
+    lines = [None] * len(chunk)
+    _record_error_lines(chunk, errors, lines)
+    if valid:
+        for position, expected in zip(valid, state['model'].predict(matrix)):
+            line = _record_line(*chunk[position])
+            crop = records[position].get('Crop')
+            if crop is not None:
+                line['crop'] = CROP_MAP.get(crop, crop)
+            line['expected_yield_t_per_ha'] = round(float(expected), 3)
+            lines[position] = line
+    return lines
+
+@app.route('/predict_yield_batch', methods=['POST'])
+def predict_yield_batch():
+    """Expected yield for many field records (CSV or JSON Lines), streamed back as NDJSON"""
+    state = yield_state
+    if not state:
+        return model_unavailable_response('crop_yield', 'Yield model')
+    stream, record_format, error_response = batch_record_source()
+    if error_response:
+        return error_response
+
+    buffer = np.empty((app.config['CROP_BATCH_CHUNK_ROWS'], len(state['features'])), dtype=state['encoder'].dtype)
+    return stream_scored_records(stream, record_format, lambda chunk: _score_yield_chunk(state, chunk, buffer),
+                                 'Batch yield prediction')
+
+# --- Outbound APIs ---
+open_meteo = Upstream(
+    'open-meteo', app.config['OPEN_METEO_BASE_URL'],
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['OPEN_METEO_TIMEOUT'],
+    retries=app.config['OPEN_METEO_RETRIES'],
+    deadline=app.config['OPEN_METEO_DEADLINE'],
+    failure_threshold=app.config['CIRCUIT_FAILURE_THRESHOLD'],
+    reset_timeout=app.config['CIRCUIT_RESET_SECONDS']
+)
+data_gov = Upstream(
+    'data.gov.in', app.config['DATA_GOV_BASE_URL'],
+    connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+    read_timeout=app.config['DATA_GOV_TIMEOUT'],
+    retries=app.config['DATA_GOV_RETRIES'],
+    deadline=app.config['DATA_GOV_DEADLINE'],
+    failure_threshold=app.config['CIRCUIT_FAILURE_THRESHOLD'],
+    reset_timeout=app.config['CIRCUIT_RESET_SECONDS']
+)
+
+def upstream_unavailable_response(upstream):
+    """503 with Retry-After while an upstream's circuit is open"""
+    response = jsonify({'error': f'{upstream.name} is temporarily unavailable, please retry shortly'})
+    response.headers['Retry-After'] = str(int(upstream.breaker.reset_timeout))
+    return response, 503
+
+# --- Live weather ---
+OPEN_METEO_PARAMS = {
+    'current': 'temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m',
+    'daily': 'temperature_2m_max,temperature_2m_min'
+}
+
+def weather_fields(weather_data):
+    """One open-meteo forecast mapped to the recommender's weather fields"""
+    return {
+        "T2M_MAX": weather_data['daily']['temperature_2m_max'][0],
+        "T2M_MIN": weather_data['daily']['temperature_2m_min'][0],
+        "RH2M": weather_data['current']['relative_humidity_2m'],
+        "PRECTOTCORR": weather_data['current']['precipitation'],
+        "WS2M": weather_data['current']['wind_speed_10m']
+    }
+
+def fetch_weather(lat, lon):
+    """Current conditions from open-meteo, mapped to the recommender's weather fields"""
+    response = open_meteo.get('/v1/forecast', params={'latitude': lat, 'longitude': lon, **OPEN_METEO_PARAMS})
+    return weather_fields(response.json())
+
+def fetch_weather_many(coordinates):
+    """Weather fields for many (lat, lon) pairs in one open-meteo request"""
+    response = open_meteo.get('/v1/forecast', params={
+        'latitude': ','.join(str(lat) for lat, _ in coordinates),
+        'longitude': ','.join(str(lon) for _, lon in coordinates),
+        **OPEN_METEO_PARAMS
+    })
+    weather_data = response.json()
+    # A single coordinate comes back as one object rather than a list
+    if isinstance(weather_data, dict):
+        weather_data = [weather_data]
+    if len(weather_data) != len(coordinates):
+        raise ValueError(f'open-meteo returned {len(weather_data)} forecasts for {len(coordinates)} coordinates')
+    return [weather_fields(item) for item in weather_data]
+
+# The shared store (and its SQLite read on every cache miss) only exists when there are farms to prefetch
+weather_store = None
+if os.path.exists(app.config['FARM_LOCATIONS_PATH']):
+    weather_store = WeatherStore(app.config['WEATHER_STORE_PATH'])
+    if not weather_store.available:
+        print("⚠️ Weather prefetch disabled; weather is fetched on demand only.")
+        weather_store = None
+weather_cache = WeatherCache(
+    fetch_weather,
+    grid_deg=app.config['WEATHER_GRID_DEG'],
+    ttl=app.config['WEATHER_CACHE_TTL'],
+    stale_ttl=app.config['WEATHER_STALE_TTL'],
+    store=weather_store
+)
+weather_prefetcher = None
+if weather_store is not None:
+    weather_prefetcher = WeatherPrefetcher(
+        fetch_weather_many, weather_cache, weather_store, app.config['FARM_LOCATIONS_PATH'],
+        interval=app.config['WEATHER_PREFETCH_INTERVAL'],
+        batch_size=app.config['WEATHER_PREFETCH_BATCH'],
+        concurrency=app.config['WEATHER_PREFETCH_CONCURRENCY']
+    )
+    # Threads do not survive fork: with PRELOAD_MODELS=1 each worker starts it from post_fork
+    if os.environ.get('PRELOAD_MODELS') != '1':
+        weather_prefetcher.start()
+
+def parse_coordinates(data):
+    """(lat, lon, error_response) from a JSON body"""
+    if not data or 'lat' not in data or 'lon' not in data:
+        return None, None, (jsonify({'error': 'Latitude and longitude required'}), 400)
+    try:
+        lat, lon = float(data['lat']), float(data['lon'])
+    except (TypeError, ValueError):
+        return None, None, (jsonify({'error': 'Latitude and longitude must be numbers'}), 400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None, (jsonify({'error': 'Latitude or longitude out of range'}), 400)
+    return lat, lon, None
+
 @app.route('/get_live_weather', methods=['POST'])
 def get_live_weather():
     """Live weather API endpoint"""
     try:
-        data = request.get_json()
-        if not data or 'lat' not in data or 'lon' not in data:
-            return jsonify({'error': 'Latitude and longitude required'}), 400
-            
-        lat, lon = data['lat'], data['lon']
-        
-        # Call weather API
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        lat, lon, error_response = parse_coordinates(request.get_json())
+        if error_response:
+            return error_response
         
-        weather_data = response.json()
+        result, cache_status = weather_cache.get(lat, lon)
+        response = jsonify(result)
+        response.headers['X-Weather-Cache'] = cache_status
+        return response
         
-        # Extract relevant data
-        result = {
-            "T2M_MAX": weather_data['daily']['temperature_2m_max'][0],
-            "T2M_MIN": weather_data['daily']['temperature_2m_min'][0],
-            "RH2M": weather_data['current']['relative_humidity_2m'],
-            "PRECTOTCORR": weather_data['current']['precipitation'],
-            "WS2M": weather_data['current']['wind_speed_10m']
-        }
-        
-        return jsonify(result)
-        
-    except requests.exceptions.RequestException as e:
+    except CircuitOpenError:
+        return upstream_unavailable_response(open_meteo)
+    except (requests.exceptions.RequestException, TimeoutError) as e:
         app.logger.error(f"Weather API error: {e}")
         return jsonify({'error': 'Failed to fetch weather data'}), 500
     except Exception as e:
         app.logger.error(f"Weather processing error: {e}")
         return jsonify({'error': 'Failed to process weather data'}), 500
 
+# --- Location-based recommendation ---
+WEATHER_FIELDS = ('T2M_MAX', 'T2M_MIN', 'RH2M', 'PRECTOTCORR', 'WS2M')
+# Weather lookups for /recommend_for_location run here while the request validates its fields
+location_weather_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='location-weather')
+
+def _timed(fn, *args):
+    started = time.monotonic()
+    return fn(*args), round((time.monotonic() - started) * 1000, 2)
+
+@app.route('/recommend_for_location', methods=['POST'])
+def recommend_for_location():
+    """Crop recommendations for a location: live weather plus the farmer's state, season and soil values"""
+    check_crop_model_update()
+    crop = crop_state
+    if not crop:
+        return model_unavailable_response('crop_recommender', 'Crop recommendation model')
+
+    started = time.monotonic()
+    data = request.get_json(silent=True)
+    lat, lon, error_response = parse_coordinates(data)
+    if error_response:
+        return error_response
+    tier, budget_ms, error_response = requested_explain_tier(data)
+    if error_response:
+        return error_response
+
+    # The weather lookup and validating the farmer's fields do not depend on each other
+    weather_future = location_weather_executor.submit(_timed, weather_cache.get, lat, lon)
+    timings = {}
+    validate_started = time.monotonic()
+    try:
+        crop['encoder'].parse({**data, **{field: 0.0 for field in WEATHER_FIELDS}})
+    except InvalidFeaturesError as e:
+        # The lookup is left to finish; it still warms the cache for a corrected retry
+        return jsonify({'error': str(e)}), 400
+    timings['validate'] = round((time.monotonic() - validate_started) * 1000, 2)
+
+    try:
+        (weather, cache_status), timings['weather'] = weather_future.result()
+    except CircuitOpenError:
+        return upstream_unavailable_response(open_meteo)
+    except (requests.exceptions.RequestException, TimeoutError) as e:
+        app.logger.error(f"Weather API error: {e}")
+        return jsonify({'error': 'Failed to fetch weather data'}), 500
+
+    try:
+        # The fetched weather is part of the payload for both the recommender and the yield model
+        payload = {**data, **weather}
+        try:
+            values = crop['encoder'].parse(payload)
+        except InvalidFeaturesError as e:
+            app.logger.error(f"Incomplete weather data for ({lat}, {lon}): {e}")
+            return jsonify({'error': 'Weather data for this location is incomplete'}), 502
+
+        response_data = crop_recommendation(crop, values, payload, tier, budget_ms, started, timings)
+        response_data['weather'] = {field: weather[field] for field in WEATHER_FIELDS}
+        response_data['weather_cache'] = cache_status
+        timings['total'] = round((time.monotonic() - started) * 1000, 2)
+        response_data['timings_ms'] = timings
+        return jsonify(response_data)
+
+    except Exception as e:
+        app.logger.error(f"Location recommendation error: {e}")
+        return jsonify({'error': 'Failed to generate recommendations'}), 500
+
 @app.route('/calculate_fertilizer', methods=['POST'])
 def calculate_fertilizer():
     """Fertilizer calculation API endpoint"""
@@ -371,14 +1327,14 @@ def get_market_prices():
             
         state_from_user = data['state']
         api_state_name = STATE_MAP_PRICES.get(state_from_user, state_from_user)
-        api_key = "579b464db66ec23bdd000001cdd3946e44ce4aad7209ff7b23ac571b"
         
         # Fetch latest 1000 records from the API
-        url = (f"https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
-               f"?api-key={api_key}&format=json&limit=1000&sort[arrival_date]=desc")
-        
-        response = requests.get(url, timeout=20)
-        response.raise_for_status()
+        response = data_gov.get('/resource/9ef84268-d588-465a-a308-a864a43d0070', params={
+            'api-key': app.config['DATA_GOV_API_KEY'],
+            'format': 'json',
+            'limit': 1000,
+            'sort[arrival_date]': 'desc'
+        })
         price_data = response.json()
         
         # Convert to DataFrame and filter by state
@@ -403,6 +1359,8 @@ def get_market_prices():
         
         return jsonify({'prices': final_records})
         
+    except CircuitOpenError:
+        return upstream_unavailable_response(data_gov)
     except requests.exceptions.RequestException as e:
         app.logger.error(f"Market prices API error: {e}")
         return jsonify({'error': 'Failed to fetch market prices from external API'}), 500
@@ -410,7 +1368,125 @@ def get_market_prices():
         app.logger.error(f"Market prices processing error: {e}")
         return jsonify({'error': 'Failed to process market prices'}), 500
 
+# --- Admin ---
+# Retrain status and the one-at-a-time guard live in files next to the pointer
+# (crop_retrain.read_status / acquire_lock), so every worker sees the same state.
+
+def admin_authorized():
+    """(ok, error_response) for the X-Admin-Token header; admin routes 404 when no token is set"""
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        return False, (jsonify({'error': 'Not found'}), 404)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return False, (jsonify({'error': 'Invalid admin token'}), 403)
+    return True, None
+
+def _run_crop_retrain(lock_file, extra_trees, holdout, started_at):
+    started = time.monotonic()
+    try:
+        summary = crop_retrain.retrain(extra_trees=extra_trees, holdout=holdout)
+        status = {'state': 'published', 'summary': summary}
+        # Let this worker pick up the new pointer on its next crop request
+        with _crop_reload_lock:
+            _crop_reload['checked'] = 0.0
+    except crop_retrain.RetrainRejected as e:
+        status = {'state': 'rejected', 'error': str(e)}
+    except Exception as e:
+        app.logger.error(f"Crop retrain failed: {e}")
+        status = {'state': 'failed', 'error': str(e)}
+    status.update(started_at=started_at, seconds=round(time.monotonic() - started, 1))
+    try:
+        crop_retrain.write_status(status)
+    except OSError as e:
+        app.logger.error(f"Could not record crop retrain status: {e}")
+    finally:
+        lock_file.close()
+
+@app.route('/admin/retrain_crop', methods=['GET', 'POST'])
+def admin_retrain_crop():
+    """Retrain the crop recommender with appended data in the background (GET for status)
+
+    An optional CSV 'file' is saved to the appended-data directory first.
+    """
+    ok, error_response = admin_authorized()
+    if not ok:
+        return error_response
+    if request.method == 'GET':
+        return jsonify(crop_retrain.read_status())
+
+    try:
+        extra_trees = int(request.form.get('extra_trees', 20))
+        holdout = float(request.form.get('holdout', 0.2))
+    except ValueError:
+        return jsonify({'error': 'extra_trees must be an integer and holdout a fraction'}), 400
+    if not 0 < holdout < 1 or extra_trees < 1:
+        return jsonify({'error': 'extra_trees must be positive and holdout between 0 and 1'}), 400
+
+    upload = request.files.get('file')
+    if upload and upload.filename and not upload.filename.lower().endswith('.csv'):
+        return jsonify({'error': 'file must be a CSV'}), 400
+    try:
+        lock_file = crop_retrain.acquire_lock()
+        if lock_file is None:
+            return jsonify(crop_retrain.read_status()), 409
+        status = {'state': 'running', 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        try:
+            if upload and upload.filename:
+                os.makedirs(crop_retrain.APPENDED_DIR, exist_ok=True)
+                saved = os.path.join(crop_retrain.APPENDED_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.csv")
+                upload.save(saved)
+            crop_retrain.write_status(status)
+        except OSError:
+            lock_file.close()
+            raise
+    except OSError as e:
+        app.logger.error(f"Could not start crop retrain: {e}")
+        return jsonify({'error': 'Could not start retrain'}), 500
+    threading.Thread(target=_run_crop_retrain, args=(lock_file, extra_trees, holdout, status['started_at']),
+                     daemon=True).start()
+    return jsonify(status), 202
+
+# --- Health Checks ---
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: 200 once every model in READY_MODELS is loaded, 503 otherwise
+
+    Other models are still reported; their endpoints answer 503/500 until they load.
+    """
+    with _model_status_lock:
+        models = {name: dict(status) for name, status in model_status.items()}
+    required = [name for name in READY_MODELS if name in models]
+    ready = all(models[name]['state'] == 'ready' for name in required)
+    # Settled: no model is still pending or loading, whatever the outcome
+    settled = all(status['state'] in ('ready', 'failed') for status in models.values())
+    return jsonify({'ready': ready, 'settled': settled, 'required': required, 'models': models}), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics():
+    """Runtime metrics for tuning: micro-batching, caches, explanation jobs and tiers"""
+    return jsonify({
+        'batching': {
+            'disease': disease_batcher.metrics(),
+            'weed': weed_batcher.metrics(),
+        },
+        'prediction_cache': prediction_cache.stats(),
+        'explanation_jobs': explanation_jobs.stats(),
+        'explanation_tiers': tier_planner.stats(),
+        'weather_cache': weather_cache.stats(),
+        'weather_prefetch': weather_prefetcher.stats() if weather_prefetcher else {'enabled': False},
+        'upstreams': {upstream.name: upstream.stats() for upstream in (open_meteo, data_gov)}
+    })
+
 # --- Error Handlers ---
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': 'Upload too large'}), 413
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('base.html'), 404
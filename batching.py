@@ -0,0 +1,121 @@
+"""
+Dynamic Micro-Batching
+Collects concurrent single-image requests into one forward pass per model
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _PendingRequest:
+    __slots__ = ('sample', 'future', 'enqueued_at')
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Batches predict() calls arriving within max_wait_ms, up to max_batch_size samples
+
+    Each caller submits a (1, ...) batch and gets back its own (1, n_classes) slice.
+    The worker thread starts lazily, so a batcher created in a preloading gunicorn
+    master still works in the forked workers.
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=16, max_wait_ms=5.0, window=1024):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=window)
+
+    def submit(self, sample):
+        self._ensure_worker()
+        request = _PendingRequest(sample)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, sample, timeout=None):
+        return self.submit(sample).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f'batcher-{self.name}', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                outputs = self.predict_fn(np.concatenate([r.sample for r in batch]))
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            finally:
+                self._record(batch, started)
+
+            offset = 0
+            for r in batch:
+                n = len(r.sample)
+                r.future.set_result(outputs[offset:offset + n])
+                offset += n
+
+    def _record(self, batch, started):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._queue_waits.extend((started - r.enqueued_at) * 1000 for r in batch)
+
+    def metrics(self):
+        with self._stats_lock:
+            waits = np.array(self._queue_waits) if self._queue_waits else np.zeros(1)
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self._batches,
+                'requests': self._requests,
+                'mean_batch_size': round(self._requests / self._batches, 2) if self._batches else 0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': {
+                    'p50': round(float(np.percentile(waits, 50)), 2),
+                    'p95': round(float(np.percentile(waits, 95)), 2),
+                    'p99': round(float(np.percentile(waits, 99)), 2),
+                },
+                'queue_depth': self._queue.qsize(),
+            }
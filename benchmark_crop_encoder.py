@@ -0,0 +1,105 @@
+"""
+Crop Feature Encoder Benchmark
+Per-request cost of the pandas get_dummies/reindex path vs the precompiled CropFeatureEncoder,
+and of sklearn predict_proba (n_jobs=-1 as trained, and n_jobs=1) vs the FlatForest evaluator.
+Also times the full-tier crop attributions: exact TreeSHAP vs the Saabas approximation.
+
+Payloads are real rows from the training CSV, sent as strings like the web form does:
+
+    python benchmark_crop_encoder.py --rows 200 --repeat 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import crop_dataset
+import crop_recommender
+from crop_attributions import CropShapExplainer
+from crop_features import CropFeatureEncoder
+from flat_forest import FlatForest
+
+
+def pandas_encode(payload, features):
+    """The previous /recommend_crop encoding"""
+    input_encoded = pd.get_dummies(pd.DataFrame([payload]))
+    return input_encoded.reindex(columns=features, fill_value=0)
+
+
+def encoder_encode(payload, encoder):
+    return encoder.encode(encoder.parse(payload))
+
+
+def time_calls(fn, payloads, repeat):
+    """Per-call latencies in microseconds over every payload, repeat times"""
+    latencies = []
+    for _ in range(repeat):
+        for payload in payloads:
+            started = time.perf_counter()
+            fn(payload)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crop recommendation feature encoding.')
+    parser.add_argument('--data', default=crop_recommender.DATA_PATH, help='training CSV (default: %(default)s)')
+    parser.add_argument('--rows', type=int, default=200, help='payloads sampled from the CSV (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the payloads (default: %(default)s)')
+    parser.add_argument('--shap-rows', type=int, default=20, help='rows timed for SHAP attributions (default: %(default)s)')
+    args = parser.parse_args()
+
+    bundle = crop_recommender.load_or_train(args.data)
+    model, features = bundle['model'], bundle['features']
+    encoder = CropFeatureEncoder.from_bundle(bundle)
+
+    df = crop_dataset.load(args.data)
+    df = df[df['Crop'].isin(list(crop_recommender.CROP_MAP))]
+    rows = df.drop(columns=crop_recommender.DROP_COLUMNS, errors='ignore')
+    rows = rows.sample(min(args.rows, len(rows)), random_state=0)
+    typed_payloads = [{key: value.item() if hasattr(value, 'item') else value for key, value in payload.items()}
+                      for payload in rows.to_dict('records')]
+    form_payloads = [{key: str(value) for key, value in payload.items()} for payload in typed_payloads]
+
+    # Same features for the same (correctly typed) input
+    for typed, form in zip(typed_payloads, form_payloads):
+        expected = pandas_encode(typed, features).to_numpy(dtype=np.float32)
+        if not np.array_equal(expected, encoder_encode(form, encoder)):
+            raise SystemExit(f'Encoder mismatch for payload {typed}')
+    print(f"✅ Encoder matches the pandas path on {len(typed_payloads)} payloads.")
+
+    forest = FlatForest.load_or_export(model, crop_recommender.forest_dir(bundle['data_hash']),
+                                       fingerprint=bundle['trained_at'])
+    X, _, _ = encoder.encode_many(form_payloads)
+    if not forest.matches(model, X):
+        raise SystemExit('FlatForest probabilities differ from sklearn')
+    print(f"✅ FlatForest matches sklearn predict_proba on {len(X)} rows.")
+    rows_X = [X[i:i + 1] for i in range(len(X))]
+
+    cases = {
+        'pandas encode': time_calls(lambda p: pandas_encode(p, features), typed_payloads, args.repeat),
+        'encoder encode': time_calls(lambda p: encoder_encode(p, encoder), form_payloads, args.repeat),
+        'pandas + predict': time_calls(lambda p: model.predict_proba(pandas_encode(p, features)), typed_payloads, args.repeat),
+        'encoder + predict': time_calls(lambda p: model.predict_proba(encoder_encode(p, encoder)), form_payloads, args.repeat),
+    }
+    model.n_jobs = -1
+    cases['sklearn n_jobs=-1'] = time_calls(model.predict_proba, rows_X, args.repeat)
+    model.n_jobs = 1
+    cases['sklearn n_jobs=1'] = time_calls(model.predict_proba, rows_X, args.repeat)
+    cases['flat forest'] = time_calls(forest.predict_proba, rows_X, args.repeat)
+
+    # Attributions are much slower than prediction; a few rows, one pass, are enough to tell
+    shap_rows = rows_X[:args.shap_rows]
+    for name, approximate in (('shap exact', False), ('shap saabas', True)):
+        explainer = CropShapExplainer(model, features, approximate=approximate)
+        cases[name] = time_calls(explainer.explain, shap_rows, 1)
+
+    print(f"\n{'path':<20}{'p50 us':>10}{'p95 us':>10}{'mean us':>10}")
+    for name, latencies in cases.items():
+        print(f"{name:<20}{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 95):>10.1f}{latencies.mean():>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
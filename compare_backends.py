@@ -0,0 +1,117 @@
+"""
+Inference Backend Comparison
+Accuracy vs latency of the Keras model and its TFLite float16/int8 conversions on a held-out sample
+
+The sample directory holds one sub-folder per class, named exactly like the
+model's class names (the PlantVillage / seedlings folder layout):
+
+    python compare_backends.py --model disease --samples holdout/disease --limit 500
+"""
+
+import argparse
+import os
+import time
+
+# Import the app without loading any models; this script loads its own
+os.environ.setdefault('DEFER_MODEL_LOADING', 'disease,weed,crop_recommender,crop_yield')
+
+import numpy as np
+import tensorflow as tf
+
+import app as app_module
+import image_ingest
+import tflite_backend
+
+MODELS = {
+    'disease': ('disease_detection_model.h5', app_module.DISEASE_CLASSES),
+    'weed': ('weed_detection_model.h5', app_module.WEED_CLASSES),
+}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_samples(sample_dir, class_names, limit):
+    """Collect (path, label index) pairs, spreading the limit evenly across classes"""
+    per_class = {}
+    for class_name in sorted(os.listdir(sample_dir)):
+        class_dir = os.path.join(sample_dir, class_name)
+        if not os.path.isdir(class_dir) or class_name not in class_names:
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        per_class[class_name] = [os.path.join(class_dir, f) for f in files]
+
+    samples = []
+    while per_class and len(samples) < limit:
+        for class_name in list(per_class):
+            if not per_class[class_name]:
+                del per_class[class_name]
+                continue
+            samples.append((per_class[class_name].pop(0), class_names.index(class_name)))
+            if len(samples) >= limit:
+                break
+    return samples
+
+
+def decode_file(path):
+    with open(path, 'rb') as f:
+        return image_ingest.decode_image(f.read())
+
+
+def evaluate(model, images, labels, reference=None):
+    """Single-image latency plus accuracy and agreement with the reference predictions"""
+    latencies = []
+    predictions = []
+    model.predict(images[:1], verbose=0)  # warm-up
+    for img in images:
+        started = time.perf_counter()
+        output = model.predict(img[np.newaxis], verbose=0)
+        latencies.append((time.perf_counter() - started) * 1000)
+        predictions.append(int(np.argmax(output)))
+    predictions = np.array(predictions)
+    result = {
+        'accuracy': float(np.mean(predictions == labels)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'predictions': predictions,
+    }
+    if reference is not None:
+        result['agreement'] = float(np.mean(predictions == reference))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Keras and TFLite inference backends.')
+    parser.add_argument('--model', choices=sorted(MODELS), required=True)
+    parser.add_argument('--samples', required=True, help='held-out directory with one folder per class')
+    parser.add_argument('--limit', type=int, default=500, help='maximum number of images (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=app_module.app.config['TFLITE_NUM_THREADS'],
+                        help='TFLite interpreter threads (default: %(default)s)')
+    args = parser.parse_args()
+
+    h5_path, class_names = MODELS[args.model]
+    samples = load_samples(args.samples, class_names, args.limit)
+    if not samples:
+        parser.error(f"No images for known {args.model} classes found in '{args.samples}'")
+    images = np.concatenate([decode_file(path) for path, _ in samples])
+    labels = np.array([label for _, label in samples])
+    print(f"Loaded {len(samples)} held-out images for the {args.model} model.")
+
+    keras_model = tf.keras.models.load_model(h5_path)
+    results = {'keras': evaluate(keras_model, images, labels)}
+    sizes = {'keras': os.path.getsize(h5_path)}
+    reference = results['keras']['predictions']
+    del keras_model
+
+    for quantization in tflite_backend.QUANTIZATIONS:
+        model = tflite_backend.load_model(h5_path, quantization, num_threads=args.threads)
+        results[f'tflite-{quantization}'] = evaluate(model, images, labels, reference)
+        sizes[f'tflite-{quantization}'] = os.path.getsize(model.model_path)
+
+    print(f"\n{'backend':<16}{'accuracy':>10}{'agree':>8}{'p50 ms':>9}{'p95 ms':>9}{'size MB':>9}")
+    for backend, result in results.items():
+        agreement = f"{result['agreement']:.3f}" if 'agreement' in result else '-'
+        print(f"{backend:<16}{result['accuracy']:>10.3f}{agreement:>8}{result['p50_ms']:>9.2f}"
+              f"{result['p95_ms']:>9.2f}{sizes[backend] / 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Crop Recommendation Attributions
+Per-prediction SHAP values from a TreeExplainer built once per loaded model
+"""
+
+import os
+
+import numpy as np
+import shap
+
+from crop_recommender import CATEGORICAL_COLUMNS
+
+
+def input_name(column, categorical=CATEGORICAL_COLUMNS):
+    """Original payload field of a model column: 'STNAME_Punjab' -> 'STNAME', 'RH2M' -> 'RH2M'"""
+    for name in categorical:
+        if column.startswith(f'{name}_'):
+            return name
+    return column
+
+
+class CropShapExplainer:
+    """Tree attributions for the crop RandomForest, grouped by payload field
+
+    The TreeExplainer (path-dependent, so no background data is needed) and its expected
+    values are computed once; explaining a request is a single shap_values() call. One-hot
+    state/season columns are summed back into STNAME / Season with a fixed grouping matrix.
+
+    By default the Saabas approximation is used: one root-to-leaf walk per tree, cheap
+    enough to run inline. Exact TreeSHAP over 100 fully grown trees and every class is
+    far slower (see benchmark_crop_encoder.py); set XAI_CROP_SHAP_APPROXIMATE=0 to use it.
+    """
+
+    def __init__(self, model, features, approximate=None):
+        self.explainer = shap.TreeExplainer(model)
+        self.classes = [str(c) for c in model.classes_]
+        self.expected_values = np.atleast_1d(np.asarray(self.explainer.expected_value, dtype=np.float64))
+        if approximate is None:
+            approximate = os.environ.get('XAI_CROP_SHAP_APPROXIMATE', '1') == '1'
+        self.approximate = approximate
+
+        self.inputs = []
+        group_of_column = []
+        for column in features:
+            name = input_name(column)
+            if name not in self.inputs:
+                self.inputs.append(name)
+            group_of_column.append(self.inputs.index(name))
+        self._grouping = np.zeros((len(features), len(self.inputs)), dtype=np.float64)
+        self._grouping[np.arange(len(features)), group_of_column] = 1.0
+
+    def _class_values(self, row):
+        """(n_classes, n_columns) SHAP values for one encoded row"""
+        values = self.explainer.shap_values(row, approximate=self.approximate, check_additivity=False)
+        if isinstance(values, list):  # older shap: one (n, columns) array per class
+            return np.stack([v[0] for v in values])
+        values = np.asarray(values)
+        return values[0].T if values.ndim == 3 else values
+
+    def explain(self, encoded_row, class_index=None):
+        """Attributions for one prediction, for the given class or the top predicted one
+
+        Returns {'class', 'base_value', 'output', 'attributions': {payload field: SHAP value}}.
+        """
+        row = np.asarray(encoded_row, dtype=np.float64).reshape(1, -1)
+        per_class = self._class_values(row)
+        outputs = self.expected_values + per_class.sum(axis=1)
+        if class_index is None:
+            class_index = int(np.argmax(outputs))
+        grouped = per_class[class_index] @ self._grouping
+        return {
+            'class': self.classes[class_index],
+            'base_value': float(self.expected_values[class_index]),
+            'output': float(outputs[class_index]),
+            'attributions': dict(zip(self.inputs, grouped.tolist()))
+        }
@@ -0,0 +1,167 @@
+"""
+Columnar Dataset Cache
+Converts the training CSV once into memory-mapped .npy columns with compact dtypes
+
+Text columns become categoricals (integer codes + category list), floats are stored as
+float32 (the tree models cast their input to float32 anyway) and integers are downcast.
+Later loads memory-map the columns instead of parsing the CSV. The cache is keyed on the
+CSV's SHA-256; its size and mtime are checked first so an unchanged file is never re-hashed.
+
+    python crop_dataset.py --data final_cleaned_data.csv   # build or validate the cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = 'final_cleaned_data.csv'
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR') or os.path.join(os.environ.get('ARTIFACT_DIR', 'artifacts'), 'datasets')
+FORMAT_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def source_hash(path=DATA_PATH):
+    """SHA-256 of the source CSV, re-hashed only when its size or mtime changed"""
+    stat = os.stat(path)
+    pointer_path = os.path.join(CACHE_DIR, f'{_stem(path)}.source.json')
+    try:
+        with open(pointer_path) as f:
+            pointer = json.load(f)
+        if pointer['size'] == stat.st_size and pointer['mtime_ns'] == stat.st_mtime_ns:
+            return pointer['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = file_hash(path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_json(pointer_path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest})
+    except OSError:
+        pass
+    return digest
+
+
+def cache_path(path, digest):
+    return os.path.join(CACHE_DIR, f'{_stem(path)}-{digest[:16]}')
+
+
+def compact(df):
+    """Categoricals for text columns, float32 floats and downcast integers"""
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_float_dtype(series):
+            columns[name] = series.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(series):
+            columns[name] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_bool_dtype(series):
+            columns[name] = series
+        else:
+            columns[name] = series.astype('category')
+    return pd.DataFrame(columns)
+
+
+def build(path, directory):
+    """Parse the CSV and write one .npy per column plus meta.json, atomically as a directory"""
+    df = compact(pd.read_csv(path))
+    tmp_dir = f'{directory}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = np.asarray(series.cat.codes)
+            columns.append({'name': name, 'kind': 'category', 'categories': series.cat.categories.tolist()})
+        else:
+            values = series.to_numpy()
+            columns.append({'name': name, 'kind': 'numeric'})
+        np.save(os.path.join(tmp_dir, f'{i}.npy'), values)
+    _write_json(os.path.join(tmp_dir, 'meta.json'),
+                {'format_version': FORMAT_VERSION, 'source': os.path.basename(path), 'rows': len(df), 'columns': columns})
+
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+    print(f"✅ Dataset '{path}' cached as columns in '{directory}'.")
+
+
+def read(directory):
+    """DataFrame over the memory-mapped columns of a built cache"""
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"dataset cache format {meta.get('format_version')} != {FORMAT_VERSION}")
+    columns = {}
+    for i, column in enumerate(meta['columns']):
+        values = np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+        if column['kind'] == 'category':
+            columns[column['name']] = pd.Categorical.from_codes(values, categories=column['categories'])
+        else:
+            columns[column['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def _remove_stale(path, keep):
+    prefix = f'{_stem(path)}-'
+    for entry in os.listdir(CACHE_DIR):
+        full = os.path.join(CACHE_DIR, entry)
+        if entry.startswith(prefix) and full != keep and os.path.isdir(full) and not entry.endswith('.tmp'):
+            shutil.rmtree(full, ignore_errors=True)
+
+
+def load(path=DATA_PATH):
+    """The dataset as a compact DataFrame, building the columnar cache if the CSV changed"""
+    directory = cache_path(path, source_hash(path))
+    try:
+        return read(directory)
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        build(path, directory)
+        _remove_stale(path, directory)
+        return read(directory)
+    except OSError as e:
+        print(f"⚠️ Could not cache dataset '{path}', reading the CSV directly: {e}")
+        return compact(pd.read_csv(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the columnar cache for a training CSV.')
+    parser.add_argument('--data', default=DATA_PATH, help='source CSV (default: %(default)s)')
+    args = parser.parse_args()
+    df = load(args.data)
+    print(f"{len(df)} rows, {len(df.columns)} columns, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Crop Feature Encoder
+Maps a /recommend_crop payload straight into the model's one-hot feature row
+
+Equivalent to pd.get_dummies(...).reindex(columns=features, fill_value=0) on a
+correctly typed payload, without building a DataFrame per request.
+"""
+
+import numpy as np
+
+
+class InvalidFeaturesError(ValueError):
+    """The payload is missing fields, has non-numeric values or unknown categories"""
+
+
+class CropFeatureEncoder:
+    """Column-index map compiled once from the artifact's feature list and category values
+
+    Training used get_dummies(drop_first=True), so the first state / season has no
+    column: it is valid and encodes as all zeros. A category that was never seen in
+    training is rejected rather than silently encoded the same way.
+    """
+
+    def __init__(self, features, categories, dtype=np.float32):
+        self.features = list(features)
+        self.dtype = dtype
+        column_index = {name: i for i, name in enumerate(self.features)}
+
+        self.categories = {}
+        self._category_index = {}
+        for field, values in categories.items():
+            self.categories[field] = [str(v).strip() for v in values]
+            self._category_index[field] = {
+                str(v).strip(): column_index.get(f'{field}_{v}') for v in values
+            }
+
+        one_hot = {i for field in categories for i, name in enumerate(self.features) if name.startswith(f'{field}_')}
+        self.numeric_fields = [name for i, name in enumerate(self.features) if i not in one_hot]
+        self._numeric_index = np.array([column_index[name] for name in self.numeric_fields], dtype=np.intp)
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        return cls(bundle['features'], {'STNAME': bundle['states'], 'Season': bundle['seasons']})
+
+    @property
+    def fields(self):
+        return self.numeric_fields + list(self.categories)
+
+    def column_for(self, field, value):
+        """One-hot column index of a category value, or None (unknown field/value, or the base value)"""
+        return self._category_index.get(field, {}).get(str(value).strip())
+
+    def parse(self, payload):
+        """Validated {field: float or category} for one payload; extra keys are ignored
+
+        Numeric fields are coerced from strings (the web form sends everything as text).
+        """
+        if not isinstance(payload, dict):
+            raise InvalidFeaturesError('Expected a JSON object of input fields')
+        values = {}
+        problems = []
+        missing = [field for field in self.fields if payload.get(field) in (None, '')]
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+
+        for field in self.numeric_fields:
+            if field in missing:
+                continue
+            try:
+                values[field] = float(payload[field])
+            except (TypeError, ValueError):
+                problems.append(f'{field} must be a number')
+            else:
+                if not np.isfinite(values[field]):
+                    problems.append(f'{field} must be a finite number')
+
+        for field, index in self._category_index.items():
+            if field in missing:
+                continue
+            value = str(payload[field]).strip()
+            if value not in index:
+                problems.append(f"unknown {field} '{value}'")
+            values[field] = value
+
+        if problems:
+            raise InvalidFeaturesError('Invalid input: ' + '; '.join(problems))
+        return values
+
+    def encode(self, values, out=None):
+        """Write parsed values into out (a preallocated zeroed (n_features,) row) or a new (1, n_features) row"""
+        row = np.zeros((1, len(self.features)), dtype=self.dtype) if out is None else out
+        target = row.reshape(-1)
+        target[self._numeric_index] = [values[field] for field in self.numeric_fields]
+        for field, index in self._category_index.items():
+            column = index[values[field]]
+            if column is not None:
+                target[column] = 1
+        return row
+
+    def encode_many(self, payloads, out=None):
+        """Parse and encode payloads into the rows of one matrix, skipping invalid ones
+
+        out, when given, is a reusable (>= len(payloads), n_features) buffer. Returns
+        (matrix of the valid rows, their positions in payloads, {position: error message}).
+        """
+        if out is None:
+            out = np.empty((len(payloads), len(self.features)), dtype=self.dtype)
+        matrix = out[:len(payloads)]
+        matrix.fill(0)
+        valid = []
+        errors = {}
+        for position, payload in enumerate(payloads):
+            try:
+                values = self.parse(payload)
+            except InvalidFeaturesError as e:
+                errors[position] = str(e)
+                continue
+            self.encode(values, out=matrix[len(valid)])
+            valid.append(position)
+        return matrix[:len(valid)], valid, errors
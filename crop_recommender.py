@@ -0,0 +1,251 @@
+"""
+Crop Recommender Artifacts
+Trains the crop recommendation model once and persists it as a versioned artifact
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+
+import crop_dataset
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+DATA_PATH = crop_dataset.DATA_PATH
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'artifacts')
+ARTIFACT_FORMAT_VERSION = 2
+
+CROP_MAP = {
+    'AREC': 'Arecanut', 'ARHR': 'Arhar/Tur', 'BAJR': 'Bajra', 'BANA': 'Banana', 'BARL': 'Barley',
+    'BLAC': 'Black pepper', 'COTN': 'Cotton', 'GNUT': 'Groundnut', 'JOWA': 'Jowar',
+    'MAIZ': 'Maize', 'MOOG': 'Moong (Green Gram)', 'ONIO': 'Onion', 'POTA': 'Potato',
+    'RAGI': 'Ragi', 'RICE': 'Rice', 'RM': 'Rapeseed & Mustard', 'SOYB': 'Soyabean',
+    'SUGC': 'Sugarcane', 'WHEAT': 'Wheat', 'CPEA': 'Cowpea', 'TURM': 'Turmeric'
+}
+DROP_COLUMNS = ['Yield_tonnes_per_hectare', 'date', 'DISTNAME', 'Area_hectares', 'Production_tonnes', 'Latitude', 'Longitude', 'latitude', 'longitude', 'Crop', 'Year.1']
+CATEGORICAL_COLUMNS = ['STNAME', 'Season']
+
+
+def dataset_hash(path=DATA_PATH):
+    """SHA-256 of the training CSV, used to key the artifact (cached while the file is unchanged)"""
+    return crop_dataset.source_hash(path)
+
+
+def artifact_key(data_hash):
+    """Artifact key: dataset hash plus everything else that changes the fitted model"""
+    digest = hashlib.sha256()
+    digest.update(data_hash.encode())
+    digest.update(','.join(sorted(CROP_MAP)).encode())
+    digest.update(f'v{ARTIFACT_FORMAT_VERSION}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(data_hash):
+    return os.path.join(ARTIFACT_DIR, f'crop_recommender-{artifact_key(data_hash)}.joblib')
+
+
+def forest_dir(data_hash):
+    """Directory of the flat-array export of the forest (see flat_forest.py)"""
+    return os.path.join(ARTIFACT_DIR, f'crop_forest-{artifact_key(data_hash)}')
+
+
+def prepare(df):
+    """Filter to known crops and one-hot encode: (features, target, states, seasons)"""
+    df = df[df['Crop'].isin(list(CROP_MAP.keys()))]
+    states = sorted(str(state) for state in df['STNAME'].unique())
+    seasons = sorted(str(season) for season in df['Season'].unique())
+
+    features = df.drop(columns=DROP_COLUMNS, errors='ignore')
+    # Only categories present after filtering get a one-hot column, as with the raw CSV
+    for column in CATEGORICAL_COLUMNS:
+        features[column] = features[column].astype('category').cat.remove_unused_categories()
+    target = df['Crop'].astype(str)
+
+    features_encoded = pd.get_dummies(features, columns=CATEGORICAL_COLUMNS, drop_first=True)
+    return features_encoded, target, states, seasons
+
+
+def make_bundle(model, features, states, seasons, **extra):
+    return {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'sklearn_version': sklearn.__version__,
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': model,
+        'features': list(features),
+        'states': states,
+        'seasons': seasons,
+        **extra,
+    }
+
+
+def train(path=DATA_PATH):
+    """Fit the recommender on the dataset and return it as an artifact bundle"""
+    df = crop_dataset.load(path)
+    print(f"✅ Full dataset '{path}' loaded for recommender.")
+    features_encoded, target, states, seasons = prepare(df)
+
+    print("Training the Crop Recommendation model...")
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+    model.fit(features_encoded, target)
+    print("✅ Crop recommendation model trained successfully!")
+
+    return make_bundle(model, features_encoded.columns, states, seasons)
+
+
+def export(bundle, path):
+    """Write the bundle atomically so concurrent readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    # Uncompressed so the numpy arrays inside can be memory-mapped on load
+    joblib.dump(bundle, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """Load an exported bundle, memory-mapping its arrays where possible"""
+    bundle = joblib.load(path, mmap_mode='r')
+    if bundle.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"artifact format {bundle.get('format_version')} != {ARTIFACT_FORMAT_VERSION}")
+    if bundle.get('sklearn_version') != sklearn.__version__:
+        raise ValueError(f"artifact built with scikit-learn {bundle.get('sklearn_version')}, running {sklearn.__version__}")
+    return bundle
+
+
+def _artifact_mtime(target):
+    try:
+        return os.stat(target).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_artifact(target):
+    """The bundle at target, or None if it is missing or unusable"""
+    if not os.path.exists(target):
+        return None
+    try:
+        bundle = load(target)
+        print(f"✅ Crop recommendation model loaded from '{target}'.")
+        return bundle
+    except Exception as e:
+        print(f"⚠️ Ignoring unusable artifact '{target}': {e}")
+        return None
+
+
+def _lock_training(target):
+    """Block until no other process is training this artifact; returns the lock file (close to release) or None"""
+    if fcntl is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        lock_file = open(f'{target}.lock', 'a')
+    except OSError as e:
+        print(f"⚠️ Could not lock crop model training, training without it: {e}")
+        return None
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def load_or_train(path=DATA_PATH, force=False):
+    """Return the bundle for the current dataset, training only when no valid artifact exists
+
+    Training holds a lock next to the artifact, so when several workers start together
+    only one trains and the others wait and load its result.
+    """
+    data_hash = dataset_hash(path)
+    target = artifact_path(data_hash)
+    seen_mtime = _artifact_mtime(target)
+
+    bundle = None if force else _load_artifact(target)
+    if bundle is not None:
+        return bundle
+
+    lock_file = _lock_training(target)
+    try:
+        # Another process may have written the artifact while we waited for the lock
+        if _artifact_mtime(target) != seen_mtime:
+            bundle = _load_artifact(target)
+            if bundle is not None:
+                return bundle
+
+        bundle = train(path)
+        bundle['data_hash'] = data_hash
+        try:
+            export(bundle, target)
+            print(f"✅ Crop recommendation model exported to '{target}'.")
+        except OSError as e:
+            print(f"⚠️ Could not export crop recommendation model: {e}")
+        return bundle
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+
+# --- Published model pointer ---
+# Retrained models (see crop_retrain.py) are published by atomically replacing this file;
+# every worker polls it and hot-swaps to the artifact it names.
+POINTER_PATH = os.path.join(ARTIFACT_DIR, 'crop_recommender.current.json')
+
+
+def publish(bundle, path):
+    """Point all workers at an exported bundle"""
+    pointer = {
+        'artifact': path,
+        'data_hash': bundle['data_hash'],
+        'base_data_hash': bundle.get('base_data_hash', bundle['data_hash']),
+        'trained_at': bundle['trained_at'],
+    }
+    tmp_path = f'{POINTER_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(pointer, f)
+    os.replace(tmp_path, POINTER_PATH)
+
+
+def read_pointer():
+    try:
+        with open(POINTER_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pointer_version():
+    """Cheap change check for the published pointer: its mtime, or None if there is none"""
+    try:
+        return os.stat(POINTER_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_current(path=DATA_PATH, force=False):
+    """The published model if it was built on the current dataset, else load_or_train()"""
+    pointer = None if force else read_pointer()
+    if pointer and pointer.get('base_data_hash') == dataset_hash(path):
+        try:
+            bundle = load(pointer['artifact'])
+            print(f"✅ Crop recommendation model loaded from published '{pointer['artifact']}'.")
+            return bundle
+        except Exception as e:
+            print(f"⚠️ Ignoring published model '{pointer.get('artifact')}': {e}")
+    return load_or_train(path, force=force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and export the crop recommendation model.')
+    parser.add_argument('--data', default=DATA_PATH, help='training CSV (default: %(default)s)')
+    parser.add_argument('--force', action='store_true', help='retrain even if an artifact for this dataset exists')
+    args = parser.parse_args()
+    load_or_train(args.data, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
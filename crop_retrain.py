@@ -0,0 +1,192 @@
+"""
+Incremental Crop Recommender Retraining
+Trains a new model from the base dataset plus appended season data, validates it and publishes it
+
+New data is dropped into data/appended/ as CSV files with the same columns as
+final_cleaned_data.csv. The appended rows are split into train and holdout. When the
+classes and one-hot features are unchanged, the current forest is extended with extra
+trees (warm_start); otherwise a fresh forest is trained. The candidate is published
+only if its holdout accuracy is within tolerance of the current model's. Live workers
+pick up the new pointer file and swap models without a restart.
+
+Only one retrain runs at a time across all processes (an fcntl lock next to the
+pointer file), and its status is kept in a file there so any worker can report it.
+
+    python crop_retrain.py --extra-trees 20 --holdout 0.2
+"""
+
+import argparse
+import copy
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+import crop_dataset
+import crop_recommender
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+APPENDED_DIR = os.environ.get('APPENDED_DATA_DIR', os.path.join('data', 'appended'))
+LOCK_PATH = os.path.join(crop_recommender.ARTIFACT_DIR, 'crop_retrain.lock')
+STATUS_PATH = os.path.join(crop_recommender.ARTIFACT_DIR, 'crop_retrain.status.json')
+
+
+class RetrainRejected(Exception):
+    """The candidate model did not pass holdout validation"""
+
+
+def acquire_lock():
+    """Open lock file if no other retrain is running anywhere, else None; close it to release"""
+    os.makedirs(crop_recommender.ARTIFACT_DIR, exist_ok=True)
+    lock_file = open(LOCK_PATH, 'a')
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def write_status(status):
+    tmp_path = f'{STATUS_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, STATUS_PATH)
+
+
+def read_status():
+    """Last written retrain status; a 'running' status whose process is gone reads as 'interrupted'"""
+    try:
+        with open(STATUS_PATH) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {'state': 'idle'}
+    if status.get('state') == 'running' and fcntl is not None:
+        lock_file = acquire_lock()
+        if lock_file is not None:
+            lock_file.close()
+            status['state'] = 'interrupted'
+    return status
+
+
+def appended_files(appended_dir=APPENDED_DIR):
+    return sorted(glob.glob(os.path.join(appended_dir, '*.csv')))
+
+
+def combined_hash(path, files):
+    """Key for base dataset + appended files, so each combination gets its own artifact"""
+    digest = hashlib.sha256(crop_recommender.dataset_hash(path).encode())
+    for file in files:
+        digest.update(crop_dataset.source_hash(file).encode())
+    return digest.hexdigest()
+
+
+def _accuracy(model, features, X, y):
+    X = X.reindex(columns=features, fill_value=0)
+    return float(np.mean(model.predict(X) == y.to_numpy()))
+
+
+def retrain(path=crop_recommender.DATA_PATH, appended_dir=APPENDED_DIR, extra_trees=20,
+            holdout=0.2, tolerance=0.02, publish=True):
+    """Train, validate and (optionally) publish a model that includes the appended data
+
+    Returns a summary dict; raises RetrainRejected if validation fails and
+    ValueError if there is nothing new to train on.
+    """
+    files = appended_files(appended_dir)
+    if not files:
+        raise ValueError(f"No appended CSV files in '{appended_dir}'")
+    data_hash = combined_hash(path, files)
+    target_path = crop_recommender.artifact_path(data_hash)
+
+    current = crop_recommender.load_current(path)
+    base = crop_dataset.load(path)
+    appended = pd.concat([crop_dataset.load(file) for file in files], ignore_index=True)
+
+    # Encode everything together so every row gets the same one-hot columns
+    combined = pd.concat([base, appended], ignore_index=True)
+    X_all, y_all, states, seasons = crop_recommender.prepare(combined)
+
+    # Holdout comes from the new rows only, which the current model has never seen
+    new_rows = X_all.index[X_all.index >= len(base)]
+    if len(new_rows) < 2:
+        raise ValueError('Appended data has fewer than two rows for known crops')
+    _, holdout_rows = train_test_split(new_rows, test_size=holdout, random_state=42)
+    X_train, y_train = X_all.drop(index=holdout_rows), y_all.drop(index=holdout_rows)
+    X_holdout, y_holdout = X_all.loc[holdout_rows], y_all.loc[holdout_rows]
+
+    model = current['model']
+    features = X_train.columns.tolist()
+    warm = features == current['features'] and set(y_train.unique()) == set(model.classes_)
+    if warm:
+        print(f"Adding {extra_trees} trees to the current crop recommender (warm start)...")
+        candidate = copy.deepcopy(model)
+        candidate.set_params(warm_start=True, n_estimators=len(model.estimators_) + extra_trees, n_jobs=-1)
+        candidate.fit(X_train, y_train)
+        candidate.set_params(warm_start=False)
+    else:
+        print("Features or classes changed; training a fresh crop recommender...")
+        candidate = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        candidate.fit(X_train, y_train)
+
+    current_accuracy = _accuracy(model, current['features'], X_holdout, y_holdout)
+    candidate_accuracy = _accuracy(candidate, features, X_holdout, y_holdout)
+    summary = {
+        'warm_start': warm,
+        'trees': len(candidate.estimators_),
+        'holdout_rows': len(y_holdout),
+        'current_accuracy': round(current_accuracy, 4),
+        'candidate_accuracy': round(candidate_accuracy, 4),
+        'appended_files': [os.path.basename(file) for file in files],
+    }
+    if candidate_accuracy < current_accuracy - tolerance:
+        raise RetrainRejected(f"holdout accuracy {candidate_accuracy:.3f} is below current {current_accuracy:.3f}")
+
+    bundle = crop_recommender.make_bundle(candidate, features, states, seasons,
+                                          data_hash=data_hash,
+                                          base_data_hash=crop_recommender.dataset_hash(path),
+                                          validation=summary)
+    crop_recommender.export(bundle, target_path)
+    summary['artifact'] = target_path
+    if publish:
+        crop_recommender.publish(bundle, target_path)
+        print(f"✅ Published retrained crop recommender '{target_path}'.")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retrain the crop recommender with appended data and publish it.')
+    parser.add_argument('--data', default=crop_recommender.DATA_PATH, help='base training CSV (default: %(default)s)')
+    parser.add_argument('--appended', default=APPENDED_DIR, help='directory of appended CSVs (default: %(default)s)')
+    parser.add_argument('--extra-trees', type=int, default=20, help='trees added on warm start (default: %(default)s)')
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of appended rows held out (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='allowed holdout accuracy drop vs the current model (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='validate and export but do not publish')
+    args = parser.parse_args()
+    lock_file = acquire_lock()
+    if lock_file is None:
+        raise SystemExit("❌ Another crop retrain is already running.")
+    try:
+        summary = retrain(args.data, args.appended, args.extra_trees, args.holdout, args.tolerance,
+                          publish=not args.dry_run)
+    except (RetrainRejected, ValueError) as e:
+        raise SystemExit(f"❌ Retrain not published: {e}")
+    finally:
+        lock_file.close()
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Crop Yield Model
+Loads the shipped crop_yield_model.joblib and builds its feature encoder
+
+The encoder is compiled from the model's feature_names_in_: columns named
+'<field>_<value>' for STNAME, Season, Crop or DISTNAME are one-hot categories, and
+everything else is a numeric payload field, exactly as for /recommend_crop.
+
+Each process holds its own copy of the model: sklearn copies tree arrays on unpickling,
+so memory-mapping the file would not share them. Workers only share it when the
+gunicorn master loads it before fork (PRELOAD_MODELS=1).
+"""
+
+import os
+
+import joblib
+
+import crop_dataset
+from crop_features import CropFeatureEncoder
+from crop_recommender import CROP_MAP
+
+YIELD_MODEL_PATH = os.environ.get('YIELD_MODEL_PATH', 'crop_yield_model.joblib')
+YIELD_CATEGORICAL_COLUMNS = ['STNAME', 'Season', 'Crop', 'DISTNAME']
+CROP_CODES = {name.lower(): code for code, name in CROP_MAP.items()}
+
+
+def known_categories(data_path=crop_dataset.DATA_PATH):
+    """Category values from the training data, so the drop_first base value is still accepted"""
+    categories = {'Crop': list(CROP_MAP)}
+    try:
+        df = crop_dataset.load(data_path)
+    except OSError:
+        return categories
+    for column in YIELD_CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            values = df[column].astype('category').cat.categories
+            categories[column] = sorted(set(categories.get(column, [])) | {str(v) for v in values})
+    return categories
+
+
+def build_encoder(features, categories):
+    """CropFeatureEncoder for an arbitrary one-hot feature list"""
+    present = {}
+    for field in YIELD_CATEGORICAL_COLUMNS:
+        suffixes = {name[len(field) + 1:] for name in features if name.startswith(f'{field}_')}
+        if suffixes:
+            present[field] = sorted(suffixes | set(categories.get(field, [])))
+    return CropFeatureEncoder(features, present)
+
+
+def crop_value(encoder, value):
+    """Accept a crop code ('RICE') or display name ('Rice') in whichever form the model was trained on"""
+    value = str(value).strip()
+    code = value if value in CROP_MAP else CROP_CODES.get(value.lower(), value)
+    for candidate in (value, code, CROP_MAP.get(code)):
+        if candidate is not None and encoder.column_for('Crop', candidate) is not None:
+            return candidate
+    return code
+
+
+def load(path=YIELD_MODEL_PATH):
+    """{'model', 'features', 'encoder'} for the yield model"""
+    loaded = joblib.load(path)
+    if isinstance(loaded, dict):
+        model, features = loaded['model'], loaded.get('features')
+    else:
+        model, features = loaded, None
+    if features is None:
+        features = getattr(model, 'feature_names_in_', None)
+    if features is None:
+        raise ValueError('yield model has no feature_names_in_; cannot build its encoder')
+    features = [str(name) for name in features]
+    return {'model': model, 'features': features, 'encoder': build_encoder(features, known_categories())}
+
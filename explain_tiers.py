@@ -0,0 +1,69 @@
+"""
+Explanation Tiers
+Per-request XAI levels and the latency budget planner that downgrades them
+
+  none - prediction only
+  text - farmer-friendly text, no images or attributions
+  fast - cheap visual explanation (Grad-CAM for images)
+  full - the complete explanation (LIME for images)
+"""
+
+import threading
+
+EXPLAIN_TIERS = ('none', 'text', 'fast', 'full')
+
+
+def parse_budget_ms(value):
+    """Budget in milliseconds from a request field, or None; raises ValueError if invalid"""
+    if value is None or value == '':
+        return None
+    budget = float(value)
+    if budget < 0:
+        raise ValueError('explain_budget_ms must be non-negative')
+    return budget
+
+
+class TierPlanner:
+    """Picks the richest tier whose recent cost fits in the remaining budget
+
+    Costs are an exponential moving average per (kind, tier), e.g. ('image:disease', 'full').
+    A tier without any measurement yet is tried as long as some budget remains; 'text'
+    is treated as free, so a spent budget still returns the explanation text.
+    """
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self._costs = {}
+        self._downgrades = {}
+        self._lock = threading.Lock()
+
+    def choose(self, kind, requested, remaining_ms):
+        if remaining_ms is None or requested in ('none', 'text'):
+            return requested
+        candidates = EXPLAIN_TIERS[EXPLAIN_TIERS.index('text'):EXPLAIN_TIERS.index(requested) + 1]
+        with self._lock:
+            chosen = 'text'
+            for tier in reversed(candidates[1:]):
+                cost = self._costs.get((kind, tier))
+                if remaining_ms > 0 and (cost is None or cost <= remaining_ms):
+                    chosen = tier
+                    break
+            if chosen != requested:
+                key = f'{kind}:{requested}->{chosen}'
+                self._downgrades[key] = self._downgrades.get(key, 0) + 1
+        return chosen
+
+    def record(self, kind, tier, elapsed_ms):
+        if tier in ('none', 'text'):
+            return
+        with self._lock:
+            previous = self._costs.get((kind, tier))
+            self._costs[(kind, tier)] = elapsed_ms if previous is None else (
+                previous + self.smoothing * (elapsed_ms - previous))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'estimated_cost_ms': {f'{kind}:{tier}': round(cost, 1) for (kind, tier), cost in self._costs.items()},
+                'downgrades': dict(self._downgrades)
+            }
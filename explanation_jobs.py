@@ -0,0 +1,123 @@
+"""
+Asynchronous Explanation Jobs
+Bounded background pool for XAI work, so predictions can be returned before their explanation
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Job:
+    __slots__ = ('status', 'result', 'error', 'created_at', 'finished_at', 'done')
+
+    def __init__(self):
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def snapshot(self):
+        state = {'status': self.status}
+        if self.status == 'done':
+            state['result'] = self.result
+        elif self.status in ('failed', 'expired'):
+            state['error'] = self.error
+        return state
+
+
+class ExplanationJobQueue:
+    """Runs explanation jobs on a small thread pool with a bounded backlog
+
+    submit() refuses new work once max_pending jobs are queued or running.
+    Jobs still queued after ttl seconds are skipped instead of run, and finished
+    jobs nobody collected are forgotten ttl seconds after they complete.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32, ttl=300):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._counters = {'submitted': 0, 'dropped': 0, 'completed': 0, 'failed': 0, 'expired': 0}
+
+    def _get_executor(self):
+        # Created lazily and per process, so a pool made before a gunicorn fork is never reused
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='explain')
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) under job_id; returns False if the backlog is full"""
+        with self._lock:
+            self._sweep()
+            if job_id in self._jobs and self._jobs[job_id].status in ('pending', 'running', 'done'):
+                return True
+            pending = sum(1 for job in self._jobs.values() if job.status in ('pending', 'running'))
+            if pending >= self.max_pending:
+                self._counters['dropped'] += 1
+                return False
+            job = _Job()
+            self._jobs[job_id] = job
+            self._counters['submitted'] += 1
+            executor = self._get_executor()
+        executor.submit(self._run, job, fn, args, kwargs)
+        return True
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if time.time() - job.created_at > self.ttl:
+                self._finish(job, 'expired', error='Job expired before it started')
+                return
+            job.status = 'running'
+        try:
+            result = fn(*args, **kwargs)
+            with self._lock:
+                job.result = result
+                self._finish(job, 'done')
+        except Exception as e:
+            with self._lock:
+                self._finish(job, 'failed', error=str(e))
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self._counters['completed' if status == 'done' else status] += 1
+        job.done.set()
+
+    def _sweep(self):
+        now = time.time()
+        stale = [job_id for job_id, job in self._jobs.items()
+                 if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in stale:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Current state of a job known to this process, or None"""
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes or timeout passes; returns its state or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.done.wait(timeout)
+        with self._lock:
+            return job.snapshot()
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status in ('pending', 'running'))
+            return {**self._counters, 'active': active, 'max_pending': self.max_pending}
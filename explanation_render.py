@@ -0,0 +1,102 @@
+"""
+Explanation Rendering
+Composites the three-panel XAI visualization directly with NumPy/OpenCV and encodes it
+
+Stateless and thread-safe: no pyplot figures or global drawing state.
+"""
+
+import base64
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = {
+    'png': ('.png', 'image/png'),
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'webp': ('.webp', 'image/webp'),
+}
+
+# ColorBrewer RdYlGn anchors (red = negative, green = positive), as used by matplotlib
+_RDYLGN = np.array([
+    [165, 0, 38], [215, 48, 39], [244, 109, 67], [253, 174, 97], [254, 224, 139], [255, 255, 191],
+    [217, 239, 139], [166, 217, 106], [102, 189, 99], [26, 152, 80], [0, 104, 55]
+], dtype=np.float32)
+RDYLGN_LUT = np.stack([
+    np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(_RDYLGN)), _RDYLGN[:, channel])
+    for channel in range(3)
+], axis=1).astype(np.uint8)
+
+TITLE_HEIGHT = 44
+PANEL_GAP = 12
+BACKGROUND = 255
+TEXT_COLOR = (33, 33, 33)
+
+
+def colorize(values, alpha=0.8):
+    """Map a 2-D mask or heatmap onto RdYlGn, blended over white like imshow(alpha=...)"""
+    values = values.astype(np.float32)
+    low, high = float(values.min()), float(values.max())
+    scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+    colored = RDYLGN_LUT[(scaled * 255).astype(np.uint8)].astype(np.float32)
+    return (colored * alpha + BACKGROUND * (1 - alpha)).astype(np.uint8)
+
+
+def highlight(image, mask, dim=0.45, outline=(255, 215, 0)):
+    """Keep the important regions bright, dim everything else and outline the regions"""
+    focus = mask > 0
+    result = image.astype(np.float32)
+    result[~focus] *= dim
+    result = result.astype(np.uint8)
+    contours, _ = cv2.findContours(focus.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cv2.drawContours(result, contours, -1, outline, thickness=max(1, image.shape[0] // 128))
+    return result
+
+
+def _titled(panel, title, subtitle=None):
+    header = np.full((TITLE_HEIGHT, panel.shape[1], 3), BACKGROUND, dtype=np.uint8)
+    scale = panel.shape[1] / 640
+    cv2.putText(header, title, (8, 20), cv2.FONT_HERSHEY_DUPLEX, max(0.45, scale), TEXT_COLOR, 1, cv2.LINE_AA)
+    if subtitle:
+        cv2.putText(header, subtitle, (8, 38), cv2.FONT_HERSHEY_SIMPLEX, max(0.35, scale * 0.8), TEXT_COLOR, 1, cv2.LINE_AA)
+    return np.vstack([header, panel])
+
+
+def compose_panels(original, mask, panel_size=384, heatmap=None):
+    """Original | mask heatmap | highlighted overlay, side by side, as an RGB uint8 array
+
+    heatmap, when given (e.g. Grad-CAM), is drawn in the middle panel instead of the mask.
+    """
+    size = (panel_size, panel_size)
+    original = cv2.resize(original, size, interpolation=cv2.INTER_LINEAR)
+    if heatmap is not None:
+        heat = cv2.resize(colorize(heatmap), size, interpolation=cv2.INTER_LINEAR)
+    else:
+        heat = cv2.resize(colorize(mask), size, interpolation=cv2.INTER_NEAREST)
+    upscaled_mask = cv2.resize(mask.astype(np.float32), size, interpolation=cv2.INTER_NEAREST)
+    highlighted = highlight(original, upscaled_mask)
+
+    panels = [
+        _titled(original, 'Original Image'),
+        _titled(heat, 'Important Regions', '(Green=Positive, Red=Negative)'),
+        _titled(highlighted, 'AI Focus Areas'),
+    ]
+    gap = np.full((panels[0].shape[0], PANEL_GAP, 3), BACKGROUND, dtype=np.uint8)
+    row = [panels[0], gap, panels[1], gap, panels[2]]
+    return np.hstack(row)
+
+
+def encode(image_rgb, image_format='png', quality=85):
+    """Encode an RGB array; returns (base64 string, mime type)"""
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}', expected one of {sorted(IMAGE_FORMATS)}")
+    extension, mime = IMAGE_FORMATS[image_format]
+    if image_format == 'jpeg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    elif image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 3]
+    ok, buffer = cv2.imencode(extension, cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f'Could not encode explanation as {image_format}')
+    return base64.b64encode(buffer.tobytes()).decode(), mime
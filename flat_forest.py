@@ -0,0 +1,149 @@
+"""
+Flat Forest Inference
+Array-backed evaluator for a fitted sklearn RandomForestClassifier
+
+Every tree is flattened into shared node arrays (feature, threshold, children) plus
+one table of normalized leaf class distributions. All rows walk all trees together
+in vectorized NumPy, so a single-row prediction needs no joblib threads and no
+Python-level estimator objects. The arrays are saved as .npy files and memory-mapped.
+"""
+
+import json
+import os
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'leaf_slot', 'leaf_value', 'roots')
+FORMAT_VERSION = 1
+
+
+class FlatForest:
+    """predict_proba-compatible evaluator over flattened trees
+
+    Matches sklearn: rows are cast to float32 and compared with the float64 thresholds
+    (X <= threshold goes left), each leaf distribution is normalized as in
+    DecisionTreeClassifier.predict_proba, and trees are averaged in order.
+    """
+
+    def __init__(self, arrays, classes, n_features, max_depth):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+        leaf_slots = []
+        offset = 0
+        leaf_offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Leaves point at themselves, so extra traversal steps are no-ops
+            left = np.where(is_leaf, nodes, tree.children_left) + offset
+            right = np.where(is_leaf, nodes, tree.children_right) + offset
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left.astype(np.int32))
+            rights.append(right.astype(np.int32))
+
+            slot = np.full(tree.node_count, -1, dtype=np.int32)
+            slot[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+            leaf_slots.append(slot)
+            proba = tree.value[is_leaf, 0, :].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_values.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            leaf_offset += int(is_leaf.sum())
+            max_depth = max(max_depth, int(tree.max_depth))
+
+        arrays = {
+            'feature': np.concatenate(features),
+            'threshold': np.concatenate(thresholds),
+            'left': np.concatenate(lefts),
+            'right': np.concatenate(rights),
+            'leaf_slot': np.concatenate(leaf_slots),
+            'leaf_value': np.concatenate(leaf_values),
+            'roots': np.array(roots, dtype=np.int32),
+        }
+        return cls(arrays, model.classes_, int(model.n_features_in_), max_depth)
+
+    def apply(self, X):
+        """Global leaf node index reached by every row in every tree: (n_rows, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.leaf_slot[self.apply(X)]
+        return self.leaf_value[leaves].sum(axis=1) / len(self.roots)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save(self, directory, fingerprint=''):
+        """Write the arrays as .npy files plus meta.json; meta is written last so it marks completeness"""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            tmp_path = os.path.join(directory, f'{name}.{os.getpid()}.tmp.npy')
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'fingerprint': fingerprint,
+            'classes': [str(c) for c in self.classes_],
+            'n_features': self.n_features_in_,
+            'max_depth': self.max_depth,
+        }
+        tmp_path = os.path.join(directory, f'meta.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory, fingerprint=None):
+        """Memory-map a saved forest; raises ValueError if it is missing or stale"""
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise ValueError(f"no flat forest in '{directory}'")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"flat forest format {meta.get('format_version')} != {FORMAT_VERSION}")
+        if fingerprint is not None and meta.get('fingerprint') != fingerprint:
+            raise ValueError('flat forest was exported from a different model')
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        return cls(arrays, meta['classes'], meta['n_features'], meta['max_depth'])
+
+    @classmethod
+    def load_or_export(cls, model, directory, fingerprint=''):
+        """Load the exported forest for this model, exporting it first if needed"""
+        try:
+            return cls.load(directory, fingerprint)
+        except (OSError, ValueError):
+            pass
+        forest = cls.from_sklearn(model)
+        try:
+            forest.save(directory, fingerprint)
+            return cls.load(directory, fingerprint)
+        except OSError as e:
+            print(f"⚠️ Could not export flat forest: {e}")
+            return forest
+
+    def matches(self, model, X, atol=1e-12):
+        """True if this forest reproduces model.predict_proba(X)"""
+        return bool(np.allclose(self.predict_proba(X), model.predict_proba(X), rtol=0, atol=atol))
@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for the Smart Agriculture app
+
+Set PRELOAD_MODELS=1 to load every model once in the master process. Workers are
+forked afterwards and share the Keras weights, the forest's node arrays and the
+imported XAI libraries copy-on-write instead of each holding a private copy.
+"""
+
+import gc
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+preload_app = os.environ.get('PRELOAD_MODELS') == '1'
+
+if preload_app:
+    # Loader threads do not survive fork, so the master must finish loading
+    # before any worker is spawned.
+    os.environ['BACKGROUND_MODEL_LOADING'] = '0'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    # Move everything allocated during preload into the permanent generation so
+    # the workers' garbage collector never writes to (and un-shares) those pages.
+    gc.freeze()
+    server.log.info("Models preloaded; %d objects frozen for copy-on-write sharing", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # TensorFlow is not fork-safe on every platform. Models named in
+    # DEFER_MODEL_LOADING (e.g. "disease,weed") were skipped by the master and
+    # are loaded here, per worker, instead.
+    import app as app_module
+    if app_module.DEFERRED_MODELS:
+        app_module.start_model_loading(background=True, names=app_module.DEFERRED_MODELS)
+    # The weather prefetch scheduler is a thread too; one worker wins its lock and runs it
+    if app_module.weather_prefetcher:
+        app_module.weather_prefetcher.start()
@@ -0,0 +1,151 @@
+"""
+Outbound HTTP Client
+Pooled keep-alive sessions per upstream, with timeouts, jittered retries and a circuit breaker
+
+Each Upstream owns a requests.Session whose HTTPAdapter keeps a pool of connections to
+its host, so repeated calls skip DNS/TCP/TLS setup. Connection errors, timeouts and
+429/5xx responses are retried a bounded number of times with full-jitter exponential
+backoff, within a total per-call deadline: no retry is started that the deadline
+cannot cover, and each attempt's timeouts are cut to what is left. After
+failure_threshold consecutive failed calls the circuit opens, and calls fail
+immediately with CircuitOpenError until reset_timeout has passed; then one trial call
+is let through.
+
+Base URLs are plain settings, so an upstream can be pointed at a local stub
+(see stub_upstreams.py).
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The upstream's circuit breaker is open; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one trial) -> closed"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+            if self.state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """One external API: base URL, pooled session, timeouts, retry policy and breaker"""
+
+    def __init__(self, name, base_url, connect_timeout=3.0, read_timeout=10.0, retries=2, backoff=0.25,
+                 pool_size=10, failure_threshold=5, reset_timeout=30, deadline=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        # Total time one get() may take across all attempts; defaults to a single attempt's worth
+        self.deadline = deadline if deadline is not None else connect_timeout + read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def _get_session(self):
+        # One session per process: pooled sockets must not be shared across a gunicorn fork
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, path='', params=None):
+        """GET base_url + path; returns the response or raises a RequestException"""
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f'{self.name} circuit is open; not calling upstream')
+
+        self._count('requests')
+        deadline = time.monotonic() + self.deadline
+        succeeded = False
+        # Every exit records an outcome, so a half-open trial slot is always released
+        try:
+            session = self._get_session()
+            error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                    if deadline - time.monotonic() - delay < self.timeout[0]:
+                        break  # not enough time left for another attempt
+                    self._count('retries')
+                    time.sleep(delay)
+                remaining = deadline - time.monotonic()
+                timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+                try:
+                    response = session.get(f'{self.base_url}{path}', params=params, timeout=timeout)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                    continue
+                if response.status_code in RETRYABLE_STATUS:
+                    error = requests.exceptions.HTTPError(f'{self.name} returned {response.status_code}', response=response)
+                    continue
+                # Anything else (2xx, or a 4xx that retrying cannot fix) means the upstream is up
+                succeeded = True
+                response.raise_for_status()
+                return response
+            raise error
+        finally:
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+                self._count('failures')
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, 'circuit': self.breaker.state, 'base_url': self.base_url, 'deadline': self.deadline}
@@ -0,0 +1,103 @@
+"""
+Image Ingestion
+Decodes uploaded images straight from memory into model-ready arrays, without touching disk
+"""
+
+import io
+import os
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """The upload exceeds the configured byte or pixel limit"""
+
+
+class InvalidImageError(ValueError):
+    """The upload is not a decodable image"""
+
+
+def read_upload(file_storage, max_bytes=MAX_IMAGE_BYTES):
+    """Read an uploaded file into memory, stopping as soon as it exceeds max_bytes"""
+    declared = file_storage.content_length
+    if declared and declared > max_bytes:
+        raise ImageTooLargeError(f'Image exceeds {max_bytes // (1024 * 1024)} MB limit')
+
+    buffer = io.BytesIO()
+    stream = file_storage.stream
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise ImageTooLargeError(f'Image exceeds {max_bytes // (1024 * 1024)} MB limit')
+    if buffer.tell() == 0:
+        raise InvalidImageError('Uploaded file is empty')
+    return buffer.getvalue()
+
+
+def decode_image(data, target_size=(128, 128)):
+    """Decode image bytes to a normalized (1, height, width, 3) float32 batch
+
+    Matches keras load_img + img_to_array / 255: full decode, RGB, nearest-neighbour resize.
+    """
+    height, width = target_size
+    try:
+        img = Image.open(io.BytesIO(data))  # reads the header only
+        if img.width * img.height > MAX_IMAGE_PIXELS:
+            raise ImageTooLargeError(f'Image exceeds {MAX_IMAGE_PIXELS} pixel limit')
+        img = img.convert('RGB')
+        if img.size != (width, height):
+            img = img.resize((width, height), Image.NEAREST)
+    except ImageTooLargeError:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    except Exception as e:
+        raise InvalidImageError(f'Could not decode image: {e}')
+
+    batch = np.asarray(img, dtype=np.float32)[np.newaxis]
+    batch /= 255.0
+    return batch
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.gif', '.tif', '.tiff')
+
+
+def iter_archive_images(stream, max_bytes=MAX_IMAGE_BYTES, max_files=None):
+    """Yield (name, bytes_or_error) for each image in a zip archive, one member at a time"""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as e:
+        raise InvalidImageError(f'Invalid zip archive: {e}')
+
+    count = 0
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith(IMAGE_EXTENSIONS) or '__MACOSX' in name:
+                continue
+            count += 1
+            if max_files and count > max_files:
+                yield name, ImageTooLargeError(f'Archive exceeds {max_files} image limit')
+                return
+            if info.file_size > max_bytes:
+                yield name, ImageTooLargeError(f'Image exceeds {max_bytes // (1024 * 1024)} MB limit')
+                continue
+            try:
+                with archive.open(info) as member:
+                    # Trust the stream, not the header, for the size limit
+                    data = member.read(max_bytes + 1)
+                if len(data) > max_bytes:
+                    yield name, ImageTooLargeError(f'Image exceeds {max_bytes // (1024 * 1024)} MB limit')
+                else:
+                    yield name, data
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+                yield name, InvalidImageError(f'Could not read archive member: {e}')
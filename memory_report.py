@@ -0,0 +1,101 @@
+"""
+Memory Report for gunicorn deployments
+Prints RSS, PSS and USS for the gunicorn master and each worker (Linux only)
+
+    python memory_report.py <master-pid> --save before.json
+    python memory_report.py <master-pid> --compare before.json
+"""
+
+import argparse
+import json
+import os
+
+
+def read_smaps_rollup(pid):
+    """Return memory counters in kB from /proc/<pid>/smaps_rollup"""
+    counters = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == 'kB':
+                counters[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss_kb': counters.get('Rss', 0),
+        'pss_kb': counters.get('Pss', 0),
+        'uss_kb': counters.get('Private_Clean', 0) + counters.get('Private_Dirty', 0),
+        'shared_kb': counters.get('Shared_Clean', 0) + counters.get('Shared_Dirty', 0),
+    }
+
+
+def child_pids(pid):
+    """Direct children of a process, i.e. the gunicorn workers"""
+    children = []
+    task_dir = f'/proc/{pid}/task'
+    for tid in os.listdir(task_dir):
+        try:
+            with open(f'{task_dir}/{tid}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return sorted(set(children))
+
+
+def collect(master_pid):
+    processes = [{'role': 'master', 'pid': master_pid, **read_smaps_rollup(master_pid)}]
+    for pid in child_pids(master_pid):
+        try:
+            processes.append({'role': 'worker', 'pid': pid, **read_smaps_rollup(pid)})
+        except OSError:
+            continue  # worker exited while we were reading
+    workers = [p for p in processes if p['role'] == 'worker']
+    totals = {key: sum(p[key] for p in processes) for key in ('rss_kb', 'pss_kb', 'uss_kb')}
+    return {'processes': processes, 'workers': len(workers), 'totals': totals}
+
+
+def _mb(kb):
+    return f'{kb / 1024:8.1f}'
+
+
+def print_report(report, title='Memory report'):
+    print(f"--- {title} ---")
+    print(f"{'role':<8}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}{'Shared MB':>11}")
+    for p in report['processes']:
+        print(f"{p['role']:<8}{p['pid']:>8}  {_mb(p['rss_kb'])}  {_mb(p['pss_kb'])}  {_mb(p['uss_kb'])}   {_mb(p['shared_kb'])}")
+    totals = report['totals']
+    print(f"{'total':<16}  {_mb(totals['rss_kb'])}  {_mb(totals['pss_kb'])}  {_mb(totals['uss_kb'])}")
+    if report['workers']:
+        worker_pss = [p['pss_kb'] for p in report['processes'] if p['role'] == 'worker']
+        print(f"Average PSS per worker: {_mb(sum(worker_pss) / len(worker_pss)).strip()} MB")
+
+
+def print_comparison(before, after):
+    print_report(before, 'Before')
+    print()
+    print_report(after, 'After')
+    print()
+    print("--- Change (after - before) ---")
+    for key, label in (('rss_kb', 'RSS'), ('pss_kb', 'PSS'), ('uss_kb', 'USS')):
+        delta = after['totals'][key] - before['totals'][key]
+        print(f"Total {label}: {delta / 1024:+.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-process memory report for a gunicorn master and its workers.')
+    parser.add_argument('pid', type=int, help='gunicorn master PID')
+    parser.add_argument('--save', help='write the report as JSON to this path')
+    parser.add_argument('--compare', help='JSON report from an earlier run to compare against')
+    args = parser.parse_args()
+
+    report = collect(args.pid)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
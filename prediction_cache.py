@@ -0,0 +1,150 @@
+"""
+Prediction Cache
+Content-addressed cache for image predictions and their XAI payloads
+
+Entries are keyed on a hash of the uploaded bytes plus the model identity, so a
+re-uploaded photo is answered without running the CNN or LIME again. There is an
+in-process LRU tier and an optional on-disk tier shared by all workers.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Two-tier (memory LRU + size-bounded disk) cache of JSON-serializable results"""
+
+    def __init__(self, max_entries=128, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'disk_evictions': 0}
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    @staticmethod
+    def make_key(data, model_id, variant=''):
+        """Key = SHA-256 over model identity, response variant and the raw image bytes"""
+        digest = hashlib.sha256()
+        digest.update(model_id.encode())
+        digest.update(b'\0')
+        digest.update(variant.encode())
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._counters['stores'] += 1
+            self._remember(key, value)
+        self._write_disk(key, value)
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- Disk tier ---
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(f.read())
+            os.utime(path)  # mark as recently used for eviction
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        try:
+            payload = json.dumps(value).encode()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Could not write prediction cache entry: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(payload)
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        """Delete least recently used files until the tier is back under 90% of its budget"""
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_bytes = total
+            self._counters['disk_evictions'] += evicted
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+            hits = counters['memory_hits'] + counters['disk_hits']
+            return {
+                **counters,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes if self.disk_dir else None,
+            }
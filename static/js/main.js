@@ -804,7 +804,7 @@ function createXAIExplanation(xai, type) {
     if (xai.explanation_image) {
         html += `
             <div class="xai-visualization">
-                <img src="data:image/png;base64,${xai.explanation_image}" 
+                <img src="data:${xai.explanation_image_mime || 'image/png'};base64,${xai.explanation_image}" 
                      alt="AI Analysis Visualization" 
                      class="xai-image">
                 <p class="text-sm text-gray-600 dark:text-gray-400 mt-2 text-center">
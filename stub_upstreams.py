@@ -0,0 +1,100 @@
+"""
+Stub Upstreams
+Local stand-in for open-meteo and data.gov.in, with injectable latency and failures
+
+    python stub_upstreams.py --port 8099 --fail-rate 0.3 --delay-ms 200
+    OPEN_METEO_BASE_URL=http://127.0.0.1:8099 DATA_GOV_BASE_URL=http://127.0.0.1:8099 python app.py
+
+Failed requests answer --fail-status (default 503). The stub serves /v1/forecast,
+including comma-separated multi-coordinate requests, and /resource/<id>.
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SAMPLE_PRICES = [
+    {'state': 'Punjab', 'market': 'Ludhiana', 'commodity': 'Wheat', 'modal_price': '2275'},
+    {'state': 'Punjab', 'market': 'Amritsar', 'commodity': 'Paddy(Dhan)(Common)', 'modal_price': '2183'},
+    {'state': 'Maharashtra', 'market': 'Nashik', 'commodity': 'Onion', 'modal_price': '1800'},
+    {'state': 'Karnataka', 'market': 'Mysore', 'commodity': 'Ragi (Finger Millet)', 'modal_price': '3846'},
+]
+
+
+def forecast(lat, lon):
+    """Deterministic, plausible weather for a coordinate"""
+    base = 30 - abs(lat - 20) * 0.5
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'current': {
+            'temperature_2m': round(base, 1),
+            'relative_humidity_2m': round(55 + (lon % 10) * 2, 1),
+            'precipitation': round((lat * lon) % 5, 1),
+            'wind_speed_10m': round(5 + lat % 7, 1),
+        },
+        'daily': {
+            'temperature_2m_max': [round(base + 5, 1)],
+            'temperature_2m_min': [round(base - 6, 1)],
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    settings = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        settings = self.settings
+        if settings.delay_ms:
+            time.sleep(settings.delay_ms / 1000)
+        if random.random() < settings.fail_rate:
+            self._send(settings.fail_status, {'error': True, 'reason': 'injected failure'})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/v1/forecast':
+            try:
+                lats = [float(v) for v in query['latitude'][0].split(',')]
+                lons = [float(v) for v in query['longitude'][0].split(',')]
+            except (KeyError, ValueError):
+                self._send(400, {'error': True, 'reason': 'latitude and longitude required'})
+                return
+            results = [forecast(lat, lon) for lat, lon in zip(lats, lons)]
+            self._send(200, results if len(results) > 1 else results[0])
+        elif url.path.startswith('/resource/'):
+            self._send(200, {'records': SAMPLE_PRICES})
+        else:
+            self._send(404, {'error': True, 'reason': 'not found'})
+
+    def log_message(self, format, *args):
+        if not self.settings.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve stub open-meteo and data.gov.in APIs.')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests that fail (default: %(default)s)')
+    parser.add_argument('--fail-status', type=int, default=503, help='status of failed requests (default: %(default)s)')
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='added latency per request (default: %(default)s)')
+    parser.add_argument('--quiet', action='store_true', help='do not log requests')
+    StubHandler.settings = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', StubHandler.settings.port), StubHandler)
+    print(f"✅ Stub upstreams listening on http://127.0.0.1:{StubHandler.settings.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+TFLite Inference Backend
+Converts the Keras .h5 image models to quantized TFLite and runs them on the TFLite interpreter
+"""
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'artifacts')
+QUANTIZATIONS = ('float16', 'int8')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_model_path(h5_path, quantization):
+    """Converted models are keyed on the source weights, quantization and TF version"""
+    digest = hashlib.sha256()
+    digest.update(file_hash(h5_path).encode())
+    digest.update(quantization.encode())
+    digest.update(tf.__version__.encode())
+    name = os.path.splitext(os.path.basename(h5_path))[0]
+    return os.path.join(ARTIFACT_DIR, f'{name}-{quantization}-{digest.hexdigest()[:16]}.tflite')
+
+
+def convert(keras_model, quantization):
+    """Convert a Keras model to a TFLite flatbuffer
+
+    float16 stores weights as half floats; int8 is dynamic-range quantization
+    (int8 weights, float activations), so neither needs a calibration dataset.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATIONS}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def load_or_convert(h5_path, quantization):
+    """Return the path of the converted model, converting and caching it if needed"""
+    path = cached_model_path(h5_path, quantization)
+    if not os.path.exists(path):
+        print(f"Converting '{h5_path}' to TFLite ({quantization})...")
+        flatbuffer = convert(tf.keras.models.load_model(h5_path), quantization)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(flatbuffer)
+        os.replace(tmp_path, path)
+        print(f"✅ TFLite model cached at '{path}'.")
+    return path
+
+
+class TFLiteModel:
+    """Runs a TFLite model behind the same predict() interface as a Keras model"""
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self.input_shape = (None,) + tuple(int(d) for d in self._input['shape'][1:])
+        # The interpreter owns a single set of tensors, so invocations must not overlap
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=self._input['dtype'])
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+
+def load_model(h5_path, quantization, num_threads=None):
+    return TFLiteModel(load_or_convert(h5_path, quantization), num_threads=num_threads)
@@ -0,0 +1,146 @@
+"""
+Weather Cache
+Grid-snapped, TTL-bounded cache for forecast lookups with single-flight and stale-while-revalidate
+
+Coordinates are snapped to a grid (0.01 degrees is about 1 km), so nearby farms share
+one entry and one upstream query for the cell centre. Entries expire at the next
+refresh boundary (multiples of ttl on the wall clock, matching how often the forecast
+provider updates). Concurrent misses for the same cell wait for a single fetch; an
+expired entry is still served for up to stale_ttl seconds while one background
+refresh replaces it.
+
+With a store (weather_prefetch.WeatherStore), a cell's fetch first reads the store,
+so results written by the prefetcher or by another worker are reused without a network
+call if they are still in the current refresh window.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'source')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.source = 'miss'
+
+
+class WeatherCache:
+    """fetch_fn(lat, lon) -> dict is only ever called with grid cell centres"""
+
+    def __init__(self, fetch_fn, grid_deg=0.01, ttl=900, stale_ttl=3600, max_entries=10000, wait_timeout=30,
+                 store=None):
+        self.fetch_fn = fetch_fn
+        self.store = store
+        self.grid_deg = grid_deg
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # cell -> (result, expires_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'coalesced': 0, 'refreshes': 0, 'errors': 0,
+                          'store_hits': 0}
+
+    def cell(self, lat, lon):
+        """Integer grid cell of a coordinate"""
+        return (int(math.floor(lat / self.grid_deg + 0.5)), int(math.floor(lon / self.grid_deg + 0.5)))
+
+    def cell_centre(self, cell):
+        # Fixed precision only strips float noise (0.1 * 3 -> 0.3); it works for any grid size
+        return round(cell[0] * self.grid_deg, 10), round(cell[1] * self.grid_deg, 10)
+
+    def _expires_at(self, now):
+        # Next refresh boundary, so every worker expires a cell at the same moment
+        return (math.floor(now / self.ttl) + 1) * self.ttl
+
+    def get(self, lat, lon):
+        """(result, status) with status 'hit', 'stale', 'store', 'miss' or 'coalesced'; raises on fetch failure"""
+        cell = self.cell(lat, lon)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is not None:
+                result, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(cell)
+                    self._counters['hits'] += 1
+                    return result, 'hit'
+                if now < expires_at + self.stale_ttl:
+                    self._counters['stale'] += 1
+                    if cell not in self._flights:
+                        flight = self._flights[cell] = _Flight()
+                        self._counters['refreshes'] += 1
+                        self._get_executor().submit(self._fetch, cell, flight)
+                    return result, 'stale'
+            flight = self._flights.get(cell)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cell] = _Flight()
+                self._counters['misses'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if leader:
+            self._fetch(cell, flight)
+        elif not flight.done.wait(self.wait_timeout):
+            raise TimeoutError('Timed out waiting for a shared weather fetch')
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, flight.source if leader else 'coalesced'
+
+    def put(self, lat, lon, result, fetched_at=None):
+        """Store a result fetched elsewhere (e.g. a bulk prefetch) for the coordinate's cell"""
+        self._store(self.cell(lat, lon), result, fetched_at or time.time())
+
+    def _store(self, cell, result, fetched_at):
+        with self._lock:
+            self._entries[cell] = (result, self._expires_at(fetched_at))
+            self._entries.move_to_end(cell)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, cell, flight):
+        try:
+            stored = self.store.get(self.grid_deg, cell) if self.store is not None else None
+            if stored is not None and time.time() < self._expires_at(stored[1]):
+                flight.result, flight.source = stored[0], 'store'
+                self._store(cell, flight.result, stored[1])
+                with self._lock:
+                    self._counters['store_hits'] += 1
+                return
+            flight.result = self.fetch_fn(*self.cell_centre(cell))
+            fetched_at = time.time()
+            self._store(cell, flight.result, fetched_at)
+            if self.store is not None:
+                self.store.put_many(self.grid_deg, [(cell, flight.result, fetched_at)])
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._counters['errors'] += 1
+        finally:
+            with self._lock:
+                self._flights.pop(cell, None)
+            flight.done.set()
+
+    def _get_executor(self):
+        # Created lazily and per process, so a pool made before a gunicorn fork is never reused
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='weather-refresh')
+            self._pid = os.getpid()
+        return self._executor
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'entries': len(self._entries), 'in_flight': len(self._flights),
+                    'grid_deg': self.grid_deg, 'ttl': self.ttl}
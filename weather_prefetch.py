@@ -0,0 +1,223 @@
+"""
+Weather Prefetch
+Refreshes weather for registered farm locations in bulk and keeps it in a local SQLite store
+
+Farm locations are read from a CSV with 'lat' and 'lon' (or 'latitude' and 'longitude')
+columns and collapsed to the weather cache's grid cells. Each run fetches the cells
+with open-meteo's multi-coordinate requests (batch_size coordinates per call, at most
+concurrency calls in flight). It writes the results to the store, which every worker's
+WeatherCache reads before going to the network.
+
+Only one process runs the scheduler: the others wait on an fcntl lock next to the
+store and take over if the holder exits.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so every process prefetches
+    fcntl = None
+
+
+class WeatherStore:
+    """Latest weather per (grid, cell), shared by every worker through one SQLite file
+
+    If the file cannot be created (e.g. a read-only artifacts/ directory) the store is
+    marked unavailable instead of raising, and callers run without it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.available = True
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS weather ('
+                    'grid_deg REAL, cell_lat INTEGER, cell_lon INTEGER, payload TEXT, fetched_at REAL, '
+                    'PRIMARY KEY (grid_deg, cell_lat, cell_lon))'
+                )
+        except (OSError, sqlite3.Error) as e:
+            self.available = False
+            print(f"⚠️ Weather store unavailable at '{path}': {e}")
+
+    def _connect(self):
+        # One connection per thread and process; sqlite connections must not cross either
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Short busy timeout: a request would rather fetch than wait on a writer
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, grid_deg, cell):
+        """(result, fetched_at) for a cell, or None if absent or the store is unreadable"""
+        if not self.available:
+            return None
+        try:
+            row = self._connect().execute(
+                'SELECT payload, fetched_at FROM weather WHERE grid_deg = ? AND cell_lat = ? AND cell_lon = ?',
+                (grid_deg, cell[0], cell[1])
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Weather store read failed: {e}")
+            return None
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put_many(self, grid_deg, rows):
+        """Upsert [(cell, result, fetched_at), ...] in one transaction"""
+        if not self.available:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?)',
+                    [(grid_deg, cell[0], cell[1], json.dumps(result), fetched_at) for cell, result, fetched_at in rows]
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Weather store write failed: {e}")
+
+    def count(self):
+        if not self.available:
+            return None
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM weather').fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+
+def load_locations(path):
+    """[(lat, lon), ...] from a farm location CSV; rows without valid coordinates are skipped"""
+    locations = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                lat = float(row.get('lat') or row.get('latitude'))
+                lon = float(row.get('lon') or row.get('longitude'))
+            except (TypeError, ValueError):
+                continue
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                locations.append((lat, lon))
+    return locations
+
+
+class WeatherPrefetcher:
+    """fetch_many([(lat, lon), ...]) -> [result, ...] is called with grid cell centres"""
+
+    def __init__(self, fetch_many, cache, store, locations_path, interval=900, batch_size=100,
+                 concurrency=4, offset=5):
+        self.fetch_many = fetch_many
+        self.cache = cache
+        self.store = store
+        self.locations_path = locations_path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.offset = offset
+        self.lock_path = f'{store.path}.lock'
+        self._lock_file = None
+        self._thread = None
+        self._pid = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'leader': False, 'runs': 0, 'cells': 0, 'fetched': 0, 'failed_batches': 0,
+                       'last_run_at': None, 'last_run_seconds': None, 'last_error': None}
+
+    def cells(self):
+        """Unique grid cells of the registered locations"""
+        return sorted({self.cache.cell(lat, lon) for lat, lon in load_locations(self.locations_path)})
+
+    def _fetch_batch(self, cells):
+        results = self.fetch_many([self.cache.cell_centre(cell) for cell in cells])
+        fetched_at = time.time()
+        rows = list(zip(cells, results, [fetched_at] * len(cells)))
+        self.store.put_many(self.cache.grid_deg, rows)
+        for cell, result, _ in rows:
+            self.cache.put(*self.cache.cell_centre(cell), result, fetched_at)
+        return len(rows)
+
+    def run_once(self):
+        """Fetch every registered cell once; returns a summary dict"""
+        started = time.monotonic()
+        cells = self.cells()
+        batches = [cells[i:i + self.batch_size] for i in range(0, len(cells), self.batch_size)]
+        fetched = failed = 0
+        last_error = None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='weather-prefetch') as executor:
+            for future in [executor.submit(self._fetch_batch, batch) for batch in batches]:
+                try:
+                    fetched += future.result()
+                except Exception as e:
+                    failed += 1
+                    last_error = str(e)
+        summary = {'cells': len(cells), 'fetched': fetched, 'failed_batches': failed,
+                   'last_run_at': time.time(), 'last_run_seconds': round(time.monotonic() - started, 2),
+                   'last_error': last_error}
+        with self._stats_lock:
+            self._stats.update(summary)
+            self._stats['runs'] += 1
+        return summary
+
+    def _acquire_leadership(self):
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held for the life of the process; the OS releases it if the process dies
+        self._lock_file = lock_file
+        return True
+
+    def _seconds_until_next_run(self):
+        # Just after the next refresh boundary, when the provider has new data
+        now = time.time()
+        return (int(now // self.interval) + 1) * self.interval + self.offset - now
+
+    def _loop(self):
+        while True:
+            if self._acquire_leadership():
+                with self._stats_lock:
+                    self._stats['leader'] = True
+                try:
+                    summary = self.run_once()
+                    print(f"✅ Weather prefetch: {summary['fetched']}/{summary['cells']} cells in "
+                          f"{summary['last_run_seconds']}s ({summary['failed_batches']} failed batches)")
+                except Exception as e:
+                    print(f"❌ Weather prefetch failed: {e}")
+                    with self._stats_lock:
+                        self._stats['last_error'] = str(e)
+            time.sleep(self._seconds_until_next_run())
+
+    def start(self):
+        """Start the scheduler thread once per process; no-op without a locations file"""
+        if self._pid == os.getpid():
+            return
+        if not os.path.exists(self.locations_path):
+            print(f"ℹ️ No farm locations at '{self.locations_path}'; weather prefetch disabled.")
+            return
+        self._pid = os.getpid()
+        # A lock fd inherited from the parent is not ours to run on
+        self._lock_file = None
+        self._thread = threading.Thread(target=self._loop, name='weather-prefetch-scheduler', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        with self._stats_lock:
+            return {**self._stats, 'enabled': self._thread is not None, 'stored_cells': self.store.count(),
+                    'interval': self.interval, 'batch_size': self.batch_size, 'concurrency': self.concurrency}
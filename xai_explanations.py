@@ -5,65 +5,100 @@ Provides farmer-friendly explanations for AI predictions
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import cv2
-import io
-import base64
-from lime import lime_image
-from lime.wrappers.scikit_image import SegmentationAlgorithm
+import os
 import shap
 from sklearn.inspection import permutation_importance
 import tensorflow as tf
 from tensorflow.keras.preprocessing import image
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+
+import explanation_render
+from crop_attributions import CropShapExplainer
+from fast_lime import FastLimeExplainer
+from gradcam import GradCAM, salient_regions
+
+IMAGE_XAI_METHODS = ('lime', 'gradcam')
 
 class AgricultureXAI:
     """Explainable AI for agriculture predictions"""
     
     def __init__(self):
         self.lime_explainer = None
+        self.gradcam = GradCAM()
+        self.crop_shap = None
+        self.default_method = os.environ.get('XAI_METHOD', 'lime')
+        self.image_format = os.environ.get('XAI_IMAGE_FORMAT', 'png')
+        self.image_quality = int(os.environ.get('XAI_IMAGE_QUALITY', '85'))
+        self.panel_size = int(os.environ.get('XAI_PANEL_SIZE', '384'))
         self.setup_lime_explainer()
         
     def setup_lime_explainer(self):
         """Initialize LIME explainer for image analysis"""
         try:
-            segmentation_fn = SegmentationAlgorithm('quickshift', kernel_size=4, max_dist=200, ratio=0.2)
-            self.lime_explainer = lime_image.LimeImageExplainer()
+            time_budget_ms = os.environ.get('XAI_TIME_BUDGET_MS')
+            self.lime_explainer = FastLimeExplainer(
+                segmentation=os.environ.get('XAI_SEGMENTATION', 'quickshift'),
+                num_samples=int(os.environ.get('XAI_NUM_SAMPLES', '100')),
+                time_budget=float(time_budget_ms) / 1000 if time_budget_ms else None,
+                batch_size=int(os.environ.get('XAI_BATCH_SIZE', '32'))
+            )
         except Exception as e:
             print(f"Warning: Could not initialize LIME explainer: {e}")
     
-    def explain_image_prediction(self, model, img_array, prediction, prediction_class, model_type='disease'):
+    def prepare_crop_explainer(self, model, features):
+        """Build the SHAP explainer for a newly loaded crop model (once per model, not per request)"""
+        try:
+            self.crop_shap = (model, CropShapExplainer(model, features))
+        except Exception as e:
+            self.crop_shap = None
+            print(f"Warning: Could not initialize SHAP explainer: {e}")
+    
+    def explain_image_prediction(self, model, img_array, prediction, prediction_class, model_type='disease',
+                                 num_samples=None, time_budget=None, segmentation=None, method=None,
+                                 gradcam_fallback='lime'):
         """
         Generate XAI explanation for image predictions (disease/weed detection)
         Returns farmer-friendly explanation with visual highlights
+
+        method is 'lime' (perturbation based, ~100 forward passes) or 'gradcam'
+        (one gradient pass); it defaults to the XAI_METHOD setting. If Grad-CAM is
+        unavailable, gradcam_fallback 'lime' runs LIME instead and 'text' returns the
+        text-only explanation, for callers that cannot afford LIME.
         """
+        method = method or self.default_method
         try:
+            # Remove batch dimension if present
+            if len(img_array.shape) == 4:
+                img_array = img_array[0]
+            
             # Convert image for LIME if needed
             if img_array.shape[-1] == 1:  # Grayscale
                 img_array = np.repeat(img_array, 3, axis=-1)
             
-            # Remove batch dimension if present
-            if len(img_array.shape) == 4:
-                img_array = img_array[0]
+            # Perturb at the model's own input size, in its own [0, 1] range
+            model_input = self._to_model_input(model, img_array)
             
-            # Ensure proper data type and range
-            if img_array.max() <= 1.0:
-                img_array = (img_array * 255).astype(np.uint8)
-            else:
-                img_array = img_array.astype(np.uint8)
+            if method == 'gradcam':
+                try:
+                    return self._explain_with_gradcam(model, model_input, prediction, prediction_class, model_type)
+                except Exception as e:
+                    if gradcam_fallback == 'text':
+                        print(f"Grad-CAM unavailable, falling back to a text explanation: {e}")
+                        return self.explain_image_text(prediction, prediction_class, model_type)
+                    print(f"Grad-CAM unavailable, falling back to LIME: {e}")
             
             # Generate LIME explanation
-            explanation = self.lime_explainer.explain_instance(
-                img_array, 
-                lambda x: self._predict_batch(model, x),
-                top_labels=3, 
-                hide_color=0, 
-                num_samples=100
+            explanation = self.lime_explainer.explain(
+                lambda batch: model.predict(batch, verbose=0),
+                model_input,
+                top_labels=3,
+                num_samples=num_samples,
+                time_budget=time_budget,
+                segmentation=segmentation
             )
             
             # Get explanation image
-            temp, mask = explanation.get_image_and_mask(
+            _, mask = explanation.get_image_and_mask(
                 explanation.top_labels[0], 
                 positive_only=True, 
                 num_features=10, 
@@ -71,7 +106,7 @@ class AgricultureXAI:
             )
             
             # Create explanation visualization
-            explanation_img = self._create_explanation_visualization(img_array, mask, temp)
+            explanation_img, explanation_mime = self._create_explanation_visualization(explanation.image, mask)
             
             # Generate farmer-friendly text explanation
             farmer_explanation = self._generate_farmer_explanation(
@@ -80,72 +115,74 @@ class AgricultureXAI:
             
             return {
                 'explanation_image': explanation_img,
+                'explanation_image_mime': explanation_mime,
                 'farmer_explanation': farmer_explanation,
                 'confidence': float(prediction),
-                'key_factors': self._extract_key_factors(explanation, model_type)
+                'key_factors': self._extract_key_factors(explanation, model_type),
+                'method': 'lime',
+                'samples': explanation.num_samples
             }
             
         except Exception as e:
             print(f"Error generating image explanation: {e}")
             return self._fallback_image_explanation(prediction, prediction_class, model_type)
     
-    def _predict_batch(self, model, images):
-        """Helper function for LIME batch predictions"""
-        try:
-            # Preprocess images for the model
-            processed_images = []
-            for img in images:
-                if img.shape != (224, 224, 3):  # Resize if needed
-                    img_resized = cv2.resize(img, (224, 224))
-                else:
-                    img_resized = img
-                
-                # Normalize
-                img_normalized = img_resized.astype(np.float32) / 255.0
-                processed_images.append(img_normalized)
-            
-            batch = np.array(processed_images)
-            predictions = model.predict(batch, verbose=0)
-            return predictions
-        except Exception as e:
-            print(f"Error in batch prediction: {e}")
-            # Return dummy predictions
-            return np.random.random((len(images), 1))
+    def explain_image_text(self, prediction, prediction_class, model_type='disease'):
+        """Text-only explanation ('text' tier): no perturbation, gradients or image rendering"""
+        return {
+            'explanation_image': None,
+            'farmer_explanation': self._generate_farmer_explanation(prediction, prediction_class, model_type, None),
+            'confidence': float(prediction),
+            'key_factors': [],
+            'method': 'text'
+        }
+    
+    def _explain_with_gradcam(self, model, model_input, prediction, prediction_class, model_type):
+        """Grad-CAM explanation in the same response shape as the LIME one"""
+        heatmap, _ = self.gradcam.heatmap(model, model_input)
+        _, regions = salient_regions(heatmap)
+        mask = (heatmap >= 0.5).astype(np.int8)
+        display_image = np.clip(model_input * 255.0, 0, 255).astype(np.uint8)
+        
+        explanation_img, explanation_mime = self._create_explanation_visualization(display_image, mask, heatmap)
+        
+        key_factors = [{
+            'factor': f'Image region {i+1}',
+            'importance': activation,
+            'effect': 'positive',
+            'description': self._describe_image_factor(i, model_type)
+        } for i, (_, activation) in enumerate(regions)]
+        
+        return {
+            'explanation_image': explanation_img,
+            'explanation_image_mime': explanation_mime,
+            'farmer_explanation': self._generate_farmer_explanation(prediction, prediction_class, model_type, None),
+            'confidence': float(prediction),
+            'key_factors': key_factors,
+            'method': 'gradcam'
+        }
+    
+    def _to_model_input(self, model, img_array):
+        """Return a float32 (H, W, 3) image in [0, 1] at the model's input size"""
+        img = img_array.astype(np.float32)
+        if img.max() > 1.0:
+            img /= 255.0
+        input_shape = getattr(model, 'input_shape', None)
+        if input_shape and len(input_shape) == 4 and input_shape[1] and input_shape[2]:
+            height, width = int(input_shape[1]), int(input_shape[2])
+            if img.shape[:2] != (height, width):
+                img = cv2.resize(img, (width, height))
+        return img
     
-    def _create_explanation_visualization(self, original_img, mask, highlighted_img):
+    def _create_explanation_visualization(self, original_img, mask, heatmap=None):
         """Create visual explanation with highlighted important regions"""
         try:
-            fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-            
-            # Original image
-            axes[0].imshow(original_img)
-            axes[0].set_title('Original Image', fontsize=12, fontweight='bold')
-            axes[0].axis('off')
-            
-            # Important regions mask
-            axes[1].imshow(mask, cmap='RdYlGn', alpha=0.8)
-            axes[1].set_title('Important Regions\n(Green=Positive, Red=Negative)', fontsize=12, fontweight='bold')
-            axes[1].axis('off')
-            
-            # Highlighted explanation
-            axes[2].imshow(highlighted_img)
-            axes[2].set_title('AI Focus Areas', fontsize=12, fontweight='bold')
-            axes[2].axis('off')
-            
-            plt.tight_layout()
-            
-            # Convert to base64 string
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-            buffer.seek(0)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
-            
-            return img_base64
+            composite = explanation_render.compose_panels(original_img, mask, panel_size=self.panel_size, heatmap=heatmap)
+            return explanation_render.encode(composite, self.image_format, self.image_quality)
             
         except Exception as e:
             print(f"Error creating visualization: {e}")
-            return None
+            return None, None
     
     def _generate_farmer_explanation(self, prediction, prediction_class, model_type, explanation):
         """Generate farmer-friendly explanation text"""
@@ -255,7 +292,7 @@ class AgricultureXAI:
         return desc_list[region_idx % len(desc_list)]
     
     def _fallback_image_explanation(self, prediction, prediction_class, model_type):
-        """Fallback explanation when XAI fails"""
+        """Fallback explanation when XAI fails; method 'fallback' marks it as not a real explanation"""
         confidence = float(prediction) * 100
         return {
             'explanation_image': None,
@@ -263,20 +300,38 @@ class AgricultureXAI:
             'confidence': float(prediction),
             'key_factors': [
                 {'factor': 'Image analysis', 'importance': 0.8, 'effect': 'positive', 'description': 'Overall visual pattern recognition'}
-            ]
+            ],
+            'method': 'fallback'
         }
     
-    def explain_crop_recommendation(self, model, input_features, feature_names, predictions, feature_values):
+    def explain_crop_recommendation(self, model, input_features, feature_names, predictions, feature_values, tier='full'):
         """
         Generate XAI explanation for crop recommendations
+
+        tier 'text' returns only the farmer explanation; 'fast' and 'full' add the
+        feature importance, environmental factors and farming recommendations.
+        'full' ranks features by this prediction's SHAP values, 'fast' by fixed weights.
         """
         try:
-            # Calculate feature importance using permutation importance
-            # Since we have a single prediction, we'll use SHAP values or manual feature analysis
+            if tier == 'text':
+                return {
+                    'recommended_crops': predictions,
+                    'farmer_explanation': self._generate_crop_explanation(predictions, feature_names, feature_values)
+                }
+            
+            # Per-prediction SHAP values when the cached explainer matches this model
+            feature_importance = None
+            if tier == 'full':
+                feature_importance = self._shap_feature_importance(model, input_features, feature_names, feature_values)
+            attribution_method = 'saabas' if self.crop_shap and self.crop_shap[1].approximate else 'shap'
+            if feature_importance is None:
+                feature_importance = self._analyze_feature_importance(feature_names, feature_values)
+                attribution_method = 'weights'
             
             explanation = {
                 'recommended_crops': predictions,
-                'feature_importance': self._analyze_feature_importance(feature_names, feature_values),
+                'feature_importance': feature_importance,
+                'attribution_method': attribution_method,
                 'farmer_explanation': self._generate_crop_explanation(predictions, feature_names, feature_values),
                 'environmental_factors': self._analyze_environmental_factors(feature_names, feature_values),
                 'recommendations': self._generate_farming_recommendations(predictions, feature_names, feature_values)
@@ -288,6 +343,36 @@ class AgricultureXAI:
             print(f"Error in crop recommendation explanation: {e}")
             return self._fallback_crop_explanation(predictions)
     
+    def _shap_feature_importance(self, model, input_features, feature_names, feature_values):
+        """Rank payload fields by their SHAP contribution to the top recommendation, or None"""
+        if self.crop_shap is None or self.crop_shap[0] is not model:
+            return None
+        try:
+            result = self.crop_shap[1].explain(input_features)
+        except Exception as e:
+            print(f"SHAP attribution failed, using fixed weights: {e}")
+            return None
+        
+        values = dict(zip(feature_names, feature_values))
+        importance_list = []
+        for feature, contribution in result['attributions'].items():
+            value = values.get(feature)
+            try:
+                status = self._get_feature_status(feature, float(value))
+            except (TypeError, ValueError):
+                status = 'normal'
+            importance_list.append({
+                'feature': self._get_friendly_feature_name(feature),
+                'value': value,
+                'importance': abs(contribution),
+                'shap_value': contribution,
+                'effect': 'positive' if contribution >= 0 else 'negative',
+                'status': status
+            })
+        
+        importance_list.sort(key=lambda x: x['importance'], reverse=True)
+        return importance_list[:6]  # Top 6 features
+    
     def _analyze_feature_importance(self, feature_names, feature_values):
         """Analyze which features most influence the recommendation"""
         # Map feature names to importance (based on agricultural knowledge)
@@ -348,6 +433,11 @@ class AgricultureXAI:
             'PRECTOTCORR': 'Rainfall',
             'RH2M': 'Humidity',
             'WS2M': 'Wind Speed',
+            'STNAME': 'State',
+            'phh2o': 'Soil pH',
+            'soc': 'Soil Organic Carbon',
+            'cec': 'Cation Exchange Capacity',
+            'nitrogen': 'Soil Nitrogen',
             'N': 'Nitrogen Level',
             'P': 'Phosphorus Level',
             'K': 'Potassium Level',